@@ -0,0 +1,57 @@
+"""Runs all the benchmarks and writes the results as a single JSON document,
+which `python -m benchmarks.compare` can diff against an earlier run.
+
+    python -m benchmarks --output results.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+from importlib import metadata
+
+from . import handlers, session_creation
+
+
+def _version(distribution):
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tornado-sqlalchemy': _version('tornado-sqlalchemy'),
+        'sqlalchemy': _version('sqlalchemy'),
+        'tornado': _version('tornado'),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--tables', type=int, default=300)
+    parser.add_argument('--binds', type=int, default=4)
+    parser.add_argument('--output', type=argparse.FileType('w'))
+
+    args = parser.parse_args()
+
+    document = {
+        'environment': environment(),
+        'benchmarks': [
+            session_creation.run(args.tables, args.binds, number=1000),
+            handlers.run(args.requests, args.concurrency),
+        ],
+    }
+
+    json.dump(document, args.output or sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compares the handler results of two `python -m benchmarks` runs, and exits
+with a non-zero status if throughput or p99 latency regressed.
+
+    python -m benchmarks.compare baseline.json results.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+
+
+def _handler_results(path):
+    with open(path) as fp:
+        document = json.load(fp)
+
+    return {
+        (result['database'], result['handler']): result
+        for benchmark in document['benchmarks']
+        if benchmark['benchmark'] == 'handlers'
+        for result in benchmark['results']
+    }
+
+
+def compare(baseline, current, threshold):
+    """Yields `(database, handler, metric, before, after, regressed)` for each
+    metric present in both runs."""
+
+    for key, before in baseline.items():
+        after = current.get(key)
+
+        if after is None:
+            continue
+
+        rps = before['requests_per_second'], after['requests_per_second']
+        yield key + ('requests_per_second',) + rps + (
+            rps[1] < rps[0] * (1 - threshold),
+        )
+
+        p99 = before['latency_ms']['p99'], after['latency_ms']['p99']
+        yield key + ('p99_ms',) + p99 + (p99[1] > p99[0] * (1 + threshold),)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+
+    regressions = 0
+
+    for database, handler, metric, before, after, regressed in compare(
+        _handler_results(args.baseline),
+        _handler_results(args.current),
+        args.threshold,
+    ):
+        regressions += regressed
+
+        print(
+            '{:<14} {:<13} {:<20} {:>10.2f} {:>10.2f} {:>+7.1%}{}'.format(
+                database,
+                handler,
+                metric,
+                before,
+                after,
+                (after - before) / before,
+                '  REGRESSED' if regressed else '',
+            )
+        )
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
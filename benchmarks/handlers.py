@@ -0,0 +1,203 @@
+"""Measures the overhead of the handler styles from `examples/basic.py`, by
+running them in a local Tornado app against SQLite.
+
+    python -m benchmarks.handlers --requests 2000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import timeit
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.pool import StaticPool
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application, RequestHandler
+
+from tornado_sqlalchemy import SessionMixin, SQLAlchemy, as_future
+
+
+db = SQLAlchemy()
+
+
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String(255), unique=True)
+
+
+class SelfSessionRequestHandler(SessionMixin, RequestHandler):
+    def get(self):
+        self.write(str(self.session.query(User).count()))
+
+
+class MakeSessionRequestHandler(SessionMixin, RequestHandler):
+    def get(self):
+        with self.make_session() as session:
+            count = session.query(User).count()
+
+        self.write(str(count))
+
+
+class AsFutureRequestHandler(SessionMixin, RequestHandler):
+    # time spent by each query waiting for a worker thread
+    queue_waits = []
+
+    async def get(self):
+        with self.make_session() as session:
+            submitted = time.perf_counter()
+
+            def count():
+                self.queue_waits.append(time.perf_counter() - submitted)
+                return session.query(User).count()
+
+            count = await as_future(count)
+
+        self.write(str(count))
+
+
+HANDLERS = (
+    ('self_session', r'/self-session', SelfSessionRequestHandler),
+    ('make_session', r'/make-session', MakeSessionRequestHandler),
+    ('as_future', r'/as-future', AsFutureRequestHandler),
+)
+
+# handlers which are run a second time, reusing sessions
+POOLED_HANDLERS = ('self_session', 'make_session')
+
+SESSION_POOL_SIZE = 64
+
+
+def _databases(directory):
+    yield 'sqlite_file', 'sqlite:///{}'.format(
+        os.path.join(directory, 'benchmark.sqlite3')
+    ), {}
+
+    # a single connection shared across threads, otherwise every worker
+    # thread would get a database of its own
+    yield 'sqlite_memory', 'sqlite://', {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False},
+    }
+
+
+def _milliseconds(samples):
+    if len(samples) < 2:
+        return None
+
+    quantiles = statistics.quantiles(samples, n=100)
+
+    return {
+        'p50': quantiles[49] * 1e3,
+        'p99': quantiles[98] * 1e3,
+        'mean': statistics.mean(samples) * 1e3,
+    }
+
+
+async def _load(url, requests, concurrency):
+    client = AsyncHTTPClient(max_clients=concurrency)
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await client.fetch(url)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await gen.multi([worker() for _ in range(concurrency)])
+
+    return time.perf_counter() - started, latencies
+
+
+async def _run(requests, concurrency, warmup):
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for database, url, engine_options in _databases(directory):
+            db.configure(url=url, engine_options=engine_options)
+            db.create_all()
+
+            seconds = min(
+                timeit.repeat(
+                    lambda: db.sessionmaker().close(), number=1000, repeat=5
+                )
+            )
+            session_creation = seconds / 1000 * 1e6
+
+            app = Application(
+                [(path, handler) for _, path, handler in HANDLERS], db=db
+            )
+
+            sock, port = bind_unused_port()
+            server = HTTPServer(app)
+            server.add_sockets([sock])
+
+            runs = [(name, path, 0) for name, path, _ in HANDLERS] + [
+                (name + '_pooled', path, SESSION_POOL_SIZE)
+                for name, path, _ in HANDLERS
+                if name in POOLED_HANDLERS
+            ]
+
+            for name, path, session_pool_size in runs:
+                url = 'http://127.0.0.1:{}{}'.format(port, path)
+                db.session_pool_size = session_pool_size
+
+                await _load(url, warmup, concurrency)
+                AsFutureRequestHandler.queue_waits.clear()
+
+                elapsed, latencies = await _load(url, requests, concurrency)
+
+                results.append(
+                    {
+                        'database': database,
+                        'handler': name,
+                        'requests': requests,
+                        'concurrency': concurrency,
+                        'session_pool_size': session_pool_size,
+                        'requests_per_second': requests / elapsed,
+                        'latency_ms': _milliseconds(latencies),
+                        'queue_wait_ms': _milliseconds(
+                            AsFutureRequestHandler.queue_waits
+                        ),
+                        'session_creation_usec': session_creation,
+                    }
+                )
+
+            server.stop()
+            await server.close_all_connections()
+
+            db.drop_all()
+            db.engine.dispose()
+
+    return results
+
+
+def run(requests, concurrency, warmup=100):
+    return {
+        'benchmark': 'handlers',
+        'results': asyncio.run(_run(requests, concurrency, warmup)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.requests, args.concurrency), indent=2))
+
+
+if __name__ == '__main__':
+    main()
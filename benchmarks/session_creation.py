@@ -0,0 +1,110 @@
+"""Measures how long it takes (and how much memory is allocated) to build and
+close a session, for a schema with many tables spread across several binds.
+
+    python -m benchmarks.session_creation --tables 300 --binds 4
+"""
+
+import argparse
+import json
+import timeit
+import tracemalloc
+
+from sqlalchemy import Column, Integer
+
+from tornado_sqlalchemy import SQLAlchemy
+
+
+def make_db(tables, binds):
+    bind_keys = ['bind_{}'.format(index) for index in range(binds)]
+
+    db = SQLAlchemy(
+        'sqlite://', binds={bind_key: 'sqlite://' for bind_key in bind_keys}
+    )
+
+    for index in range(tables):
+        # spread the tables across the default database and the binds
+        bind_key = ([None] + bind_keys)[index % (binds + 1)]
+
+        type(
+            'Model{}'.format(index),
+            (db.Model,),
+            {
+                '__tablename__': 'table_{}'.format(index),
+                '__bind_key__': bind_key,
+                'id': Column(Integer, primary_key=True),
+            },
+        )
+
+    return db
+
+
+def _peak_bytes(fn):
+    # memory allocated (and freed again) while building a session
+    fn()
+
+    tracemalloc.start()
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak - current
+
+
+def run(tables, binds, number):
+    db = make_db(tables, binds)
+    db.session_pool_size = 1
+
+    def session():
+        db.sessionmaker().close()
+
+    def session_pooled():
+        db.release_session(db.acquire_session())
+
+    def session_with_binds():
+        # what every session used to pay: a table->engine mapping passed to
+        # (and copied by) the session
+        db.sessionmaker(binds=db.get_binds()).close()
+
+    def session_recomputing_binds():
+        db._binds_map = None
+        db.sessionmaker(binds=db.get_binds()).close()
+
+    results = {}
+
+    for name, fn in (
+        ('session', session),
+        ('session_pooled', session_pooled),
+        ('session_with_binds', session_with_binds),
+        ('session_recomputing_binds', session_recomputing_binds),
+    ):
+        seconds = min(timeit.repeat(fn, number=number, repeat=5))
+        results[name] = {
+            'usec_per_session': seconds / number * 1e6,
+            'peak_bytes_per_session': _peak_bytes(fn),
+        }
+
+    return {
+        'benchmark': 'session_creation',
+        'tables': tables,
+        'binds': binds,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=300)
+    parser.add_argument('--binds', type=int, default=4)
+    parser.add_argument('--number', type=int, default=1000)
+
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.tables, args.binds, args.number), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+from http import HTTPStatus
+from unittest import skipUnless
+
+from sqlalchemy import func, select
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application, RequestHandler
+
+from tornado_sqlalchemy import AsyncSessionMixin
+
+from ._common import User, async_sqlite_url, db
+
+try:
+    import aiosqlite  # noqa: F401
+except ImportError:
+    aiosqlite = None
+
+
+@skipUnless(aiosqlite, 'aiosqlite is not installed')
+class AsyncSessionMixinTestCase(AsyncHTTPTestCase):
+    def __init__(self, *args, **kwargs):
+        super(AsyncSessionMixinTestCase, self).__init__(*args, **kwargs)
+
+        self.finished = []
+
+        class MakeSessionRequestHandler(AsyncSessionMixin, RequestHandler):
+            async def get(h_self):
+                async with h_self.make_session() as session:
+                    user = User('hunter2')
+                    user.id = 1
+                    session.add(user)
+                    await session.flush()
+
+                    count = await session.scalar(
+                        select(func.count()).select_from(User)
+                    )
+
+                h_self.write(str(count))
+
+        class UsesSelfSessionRequestHandler(AsyncSessionMixin, RequestHandler):
+            async def get(h_self):
+                count = await h_self.session.scalar(
+                    select(func.count()).select_from(User)
+                )
+
+                h_self.write(str(count))
+
+            def on_finish(h_self):
+                super().on_finish()
+
+                self.finished.append(h_self._session)
+
+        self._handlers = (
+            (r'/make-session', MakeSessionRequestHandler),
+            (r'/uses-self-session', UsesSelfSessionRequestHandler),
+        )
+
+    def setUp(self):
+        db.configure(url=async_sqlite_url)
+
+        super(AsyncSessionMixinTestCase, self).setUp()
+
+        self.io_loop.run_sync(self._run_ddl('create_all'))
+
+    def tearDown(self):
+        self.io_loop.run_sync(self._run_ddl('drop_all'))
+
+        super(AsyncSessionMixinTestCase, self).tearDown()
+
+    def get_app(self):
+        return Application(self._handlers, db=db)
+
+    def _run_ddl(self, operation):
+        async def run():
+            async with db.engine.begin() as conn:
+                await conn.run_sync(
+                    getattr(db.metadata, operation),
+                    tables=db.get_tables_for_bind(),
+                )
+
+            await db.engine.dispose()
+
+        return run
+
+    def test_is_async(self):
+        self.assertTrue(db.is_async())
+
+    def test_make_session(self):
+        response = self.fetch('/make-session', method='GET')
+
+        self.assertEqual(response.code, HTTPStatus.OK.value)
+        self.assertEqual(response.body.decode('utf-8'), '1')
+
+    def test_uses_self_session(self):
+        response = self.fetch('/uses-self-session', method='GET')
+
+        self.assertEqual(response.code, HTTPStatus.OK.value)
+        self.assertEqual(response.body.decode('utf-8'), '0')
+        self.assertEqual(self.finished, [None])
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from sqlalchemy import insert
+from tornado.testing import AsyncTestCase, gen_test
+
+from ._common import User, db, mysql_url
+
+
+class BulkTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url)
+        db.create_all()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def _usernames(self):
+        with db.sessionmaker() as session:
+            return [
+                user.username for user in session.query(User).order_by(User.id)
+            ]
+
+    @gen_test
+    async def test_insert(self):
+        progress = []
+
+        written = await db.bulk_insert(
+            User,
+            [{'username': 'User #{}'.format(i)} for i in range(25)],
+            chunk_size=10,
+            progress=lambda *args: progress.append(args),
+        )
+
+        self.assertEqual(written, 25)
+        self.assertEqual(progress, [(10, 25), (20, 25), (25, 25)])
+        self.assertEqual(len(self._usernames()), 25)
+
+    @gen_test
+    async def test_insert_iterator(self):
+        progress = []
+
+        await db.bulk_insert(
+            User,
+            ({'username': 'User #{}'.format(i)} for i in range(5)),
+            chunk_size=3,
+            progress=lambda *args: progress.append(args),
+        )
+
+        self.assertEqual(progress, [(3, None), (5, None)])
+
+    @gen_test
+    async def test_upsert(self):
+        await db.bulk_insert(
+            User, [{'id': i, 'username': 'old #{}'.format(i)} for i in (1, 2)]
+        )
+
+        written = await db.bulk_upsert(
+            User,
+            [{'id': i, 'username': 'new #{}'.format(i)} for i in (2, 3)],
+        )
+
+        self.assertEqual(written, 2)
+        self.assertEqual(self._usernames(), ['old #1', 'new #2', 'new #3'])
+
+    @gen_test
+    async def test_upsert_unsupported(self):
+        with mock.patch.object(db.engine.dialect, 'name', 'mssql'):
+            with self.assertRaises(ValueError):
+                await db.bulk_upsert(User, [{'id': 1, 'username': 'hunter2'}])
+
+        self.assertEqual(self._usernames(), [])
+
+    def test_session_bulk_operations(self):
+        with db.sessionmaker() as session:
+            session.bulk_insert_mappings(User, [{'id': 1, 'username': 'a'}])
+            session.bulk_save_objects([User('b')])
+            session.execute(insert(User), [{'id': 3, 'username': 'c'}])
+            session.bulk_update_mappings(User, [{'id': 1, 'username': 'd'}])
+            session.commit()
+
+        self.assertEqual(self._usernames(), ['d', 'b', 'c'])
@@ -0,0 +1,181 @@
+import time
+from unittest import TestCase
+from unittest.mock import Mock
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from tornado_sqlalchemy import (
+    CircuitBreaker,
+    CircuitOpenError,
+    SessionMixin,
+    SQLAlchemy,
+    as_future,
+)
+
+from ._common import User, db, mysql_url
+
+unreachable_url = 'sqlite:////nonexistent/t_sa.sqlite3'
+
+
+class CircuitBreakerTestCase(TestCase):
+    def test_trip(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+
+        breaker.record_failure()
+        breaker.check()
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertRaises(CircuitOpenError, breaker.check)
+        self.assertRaises(CircuitOpenError, breaker.probe)
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+
+        time.sleep(0.02)
+
+        # a single probe is let through
+        breaker.check()
+        breaker.probe()
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertRaises(CircuitOpenError, breaker.probe)
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_failed_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+
+        time.sleep(0.02)
+
+        breaker.probe()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.as_dict()['trips'], 2)
+        self.assertRaises(CircuitOpenError, breaker.check)
+
+
+class EngineCircuitBreakerTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(
+            url=unreachable_url,
+            circuit_breaker_threshold=2,
+            circuit_breaker_timeout=60,
+        )
+
+    def tearDown(self):
+        db.configure(url=mysql_url)
+
+        super().tearDown()
+
+    def _trip(self):
+        for _ in range(2):
+            with self.assertRaises(OperationalError):
+                with db.engine.connect():
+                    pass
+
+    def test_connection_errors(self):
+        self._trip()
+
+        with self.assertRaises(CircuitOpenError):
+            db.engine.connect()
+
+        self.assertEqual(
+            db.get_stats()['circuit_breaker'],
+            {'state': 'open', 'failures': 2, 'trips': 1},
+        )
+
+    def test_session(self):
+        self._trip()
+
+        with db.sessionmaker() as session:
+            with self.assertRaises(CircuitOpenError):
+                session.query(User).count()
+
+    @gen_test
+    async def test_as_future(self):
+        self._trip()
+
+        with self.assertRaises(CircuitOpenError):
+            await as_future(lambda: None, db=db)
+
+        # other instances have circuit breakers of their own
+        other = SQLAlchemy(url=mysql_url)
+        self.assertIsNone(await as_future(lambda: None, db=other))
+
+    def _make_handler(self, finish_on_executor=False):
+        class Base:
+            def on_finish(h_self):
+                h_self.finished = True
+
+        class Handler(SessionMixin, Base):
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': db}
+                h_self.finish_on_executor = finish_on_executor
+                h_self.finished = False
+                h_self.released = []
+
+            def _release_session(h_self, session):
+                super()._release_session(session)
+                h_self.released.append(session)
+
+        return Handler()
+
+    @gen_test
+    async def test_make_session_cleanup(self):
+        handler = self._make_handler()
+
+        async with handler.make_session() as session:
+            self._trip()
+
+        self.assertEqual(handler.released, [session])
+
+    @gen_test
+    async def test_finish_on_executor(self):
+        handler = self._make_handler(finish_on_executor=True)
+        session = handler.session
+
+        self._trip()
+        handler.on_finish()
+
+        self.assertTrue(handler.finished)
+
+        while not handler.released:
+            await gen.sleep(0.01)
+
+        self.assertEqual(handler.released, [session])
+
+    def test_recovery(self):
+        db.configure(
+            url=mysql_url,
+            circuit_breaker_threshold=1,
+            circuit_breaker_timeout=0.01,
+        )
+
+        db.get_circuit_breaker().record_failure()
+        self.assertRaises(CircuitOpenError, db.engine.connect)
+
+        time.sleep(0.02)
+
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+        self.assertEqual(db.get_stats()['circuit_breaker']['state'], 'closed')
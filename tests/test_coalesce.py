@@ -0,0 +1,102 @@
+from sqlalchemy import event, func, select
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from ._common import User, db, mysql_url
+
+
+class CoalesceTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url)
+        db.create_all()
+
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        db.drop_all()
+
+        super().tearDown()
+
+    def _on_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def _count(self, username=None):
+        statement = select(func.count()).select_from(User)
+
+        if username is not None:
+            statement = statement.where(User.username == username)
+
+        return statement
+
+    @gen_test
+    async def test_shared_execution(self):
+        results = await gen.multi(
+            [db.coalesce(self._count()) for _ in range(5)]
+        )
+
+        self.assertEqual(results, [[(0,)]] * 5)
+        self.assertEqual(len(self.statements), 1)
+
+    @gen_test
+    async def test_parameters(self):
+        await gen.multi(
+            [
+                db.coalesce(self._count('foo')),
+                db.coalesce(self._count('foo')),
+                db.coalesce(self._count('bar')),
+            ]
+        )
+
+        self.assertEqual(len(self.statements), 2)
+
+    @gen_test
+    async def test_key(self):
+        await gen.multi(
+            [
+                db.coalesce(self._count('foo'), key='count'),
+                db.coalesce(self._count('bar'), key='count'),
+            ]
+        )
+
+        self.assertEqual(len(self.statements), 1)
+
+    @gen_test
+    async def test_not_in_flight(self):
+        await db.coalesce(self._count())
+        await db.coalesce(self._count())
+
+        self.assertEqual(len(self.statements), 2)
+
+    @gen_test
+    async def test_cancel_waiter(self):
+        first = db.coalesce(self._count())
+        second = db.coalesce(self._count())
+
+        first.cancel()
+
+        self.assertEqual(await second, [(0,)])
+
+    @gen_test
+    async def test_session_with_writes(self):
+        with db.sessionmaker() as session:
+            session.add(User('hunter2'))
+
+            own, shared = await gen.multi(
+                [
+                    db.coalesce(self._count(), session=session),
+                    db.coalesce(self._count()),
+                ]
+            )
+
+            session.rollback()
+
+        self.assertEqual(own, [(1,)])
+        self.assertEqual(shared, [(0,)])
+
+    def test_select_only(self):
+        with self.assertRaises(ValueError):
+            db.coalesce(User.__table__.delete())
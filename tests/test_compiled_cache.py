@@ -0,0 +1,67 @@
+from unittest import TestCase
+
+from sqlalchemy import select
+
+from ._common import User, db, mysql_url, mysql_url_1
+
+
+class CompiledCacheTestCase(TestCase):
+    def tearDown(self):
+        db._hot_queries = []
+
+        super().tearDown()
+
+    def _query(self, username='hunter2'):
+        with db.sessionmaker() as session:
+            session.execute(select(User).where(User.username == username))
+
+    def test_shared(self):
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1},
+            compiled_cache_size=100,
+        )
+
+        self.assertIs(db.get_compiled_cache(), db.get_compiled_cache('foo'))
+
+        db.create_all()
+        try:
+            self._query()
+            self._query(username='admin')
+        finally:
+            db.drop_all()
+
+        stats = db.get_stats()['compiled_cache']
+
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertEqual(stats['capacity'], 100)
+
+    def test_per_bind(self):
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1},
+            compiled_cache_size={'foo': 10},
+        )
+
+        self.assertIsNone(db.get_compiled_cache())
+        self.assertEqual(db.get_compiled_cache('foo').capacity, 10)
+        self.assertNotIn('compiled_cache', db.get_stats())
+
+    def test_precompile(self):
+        db.configure(url=mysql_url, compiled_cache_size=100)
+        db.add_hot_query(select(User).where(User.username == 'hunter2'))
+
+        self.assertEqual(db.precompile(), 1)
+
+        cache = db.get_compiled_cache()
+        hits, misses = cache.hits, cache.misses
+
+        db.create_all()
+        try:
+            self._query(username='admin')
+        finally:
+            db.drop_all()
+
+        # the DDL isn't cached, and the query was compiled already
+        self.assertEqual(cache.misses, misses)
+        self.assertEqual(cache.hits, hits + 1)
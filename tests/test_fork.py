@@ -0,0 +1,94 @@
+import os
+from unittest import TestCase, skipUnless
+
+from sqlalchemy import text
+
+from tornado_sqlalchemy import _async_exec
+
+from ._common import db, mysql_url, mysql_url_1
+
+
+class AfterForkTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url)
+
+    def test_keeps_connections_open(self):
+        with db.engine.connect() as connection:
+            dbapi_connection = connection.connection.dbapi_connection
+
+        pool = db.engine.pool
+
+        db.after_fork()
+
+        self.assertIsNot(db.engine.pool, pool)
+        self.assertEqual(db.engine.pool.checkedin(), 0)
+
+        # the connection is still usable by the parent process
+        cursor = dbapi_connection.cursor()
+        cursor.execute('SELECT 1')
+        self.assertEqual(cursor.fetchall()[0][0], 1)
+        cursor.close()
+
+    def test_thread_pools(self):
+        pool = _async_exec._get_pool()
+
+        db.after_fork()
+
+        self.assertIsNot(_async_exec._get_pool(), pool)
+
+    @skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_fork(self):
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+        _async_exec._get_pool()
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            try:
+                ok = db.engine.pool.checkedin() == 0 and not _async_exec._pools
+                os.write(write_fd, b'1' if ok else b'0')
+            finally:
+                os._exit(0)
+
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+
+        with os.fdopen(read_fd, 'rb') as child:
+            self.assertEqual(child.read(), b'1')
+
+        self.assertEqual(db.engine.pool.checkedin(), 1)
+
+
+class ConnectionBudgetTestCase(TestCase):
+    def tearDown(self):
+        db.configure(url=mysql_url)
+
+        super().tearDown()
+
+    def test_split(self):
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1},
+            connection_budget={None: 10, 'foo': 3},
+            processes=4,
+        )
+
+        self.assertEqual(db.engine.pool.size(), 2)
+        self.assertEqual(db.engine.pool._max_overflow, 0)
+        self.assertEqual(db.get_engine('foo').pool.size(), 1)
+
+    def test_after_fork(self):
+        db.configure(url=mysql_url, connection_budget=10, processes=1)
+
+        engine = db.engine
+        self.assertEqual(engine.pool.size(), 10)
+
+        db.after_fork(processes=2)
+
+        self.assertIsNot(db.engine, engine)
+        self.assertEqual(db.engine.pool.size(), 5)
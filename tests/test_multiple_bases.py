@@ -1,5 +1,5 @@
 from unittest import TestCase, mock
-from sqlalchemy import Column, BigInteger, String
+from sqlalchemy import Column, Integer, String
 
 from ._common import db, User, mysql_url, mysql_url_1, mysql_url_2
 
@@ -13,7 +13,7 @@ class FooUser(db.FooModel):
     __bind_key__ = 'foo'
     __tablename__ = 'users'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Integer, primary_key=True)
     username = Column(String(64), unique=True)
 
     def __init__(self, username):
@@ -24,7 +24,7 @@ class BarUser(db.BarModel):
     __bind_key__ = 'bar'
     __tablename__ = 'users'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Integer, primary_key=True)
     username = Column(String(64), unique=True)
 
     def __init__(self, username):
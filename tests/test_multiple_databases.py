@@ -1,21 +1,21 @@
 from http import HTTPStatus
 from unittest import TestCase, mock
 
-from sqlalchemy import Column, BigInteger, String, text
+from sqlalchemy import Column, Integer, String, Table, select, text
 
 from tornado.testing import AsyncHTTPTestCase
 from tornado.web import Application, RequestHandler
 
 from tornado_sqlalchemy import SessionMixin
 
-from ._common import db, mysql_url, mysql_url_1, mysql_url_2
+from ._common import User, db, mysql_url, mysql_url_1, mysql_url_2
 
 
 class Foo(db.Model):
     __bind_key__ = 'foo'
     __tablename__ = 'foo'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Integer, primary_key=True)
     foo = Column(String(64))
 
     def __init__(self, foo):
@@ -26,7 +26,7 @@ class Bar(db.Model):
     __bind_key__ = 'bar'
     __tablename__ = 'bar'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Integer, primary_key=True)
     bar = Column(String(64))
 
     def __init__(self, bar):
@@ -76,6 +76,81 @@ class MultipleDatabasesTestCase(TestCase):
         self.assertEqual(foo_count, 1)
         self.assertEqual(bar_count, 2)
 
+    def test_core_statements(self):
+        session = db.sessionmaker()
+
+        self.assertIs(
+            session.get_bind(clause=Foo.__table__.select()),
+            db.get_engine('foo'),
+        )
+        self.assertIs(session.get_bind(clause=text('SELECT 1')), db.engine)
+
+        session.close()
+
+    def test_binds_cached(self):
+        binds = db.get_binds()
+
+        self.assertIs(db.get_binds(), binds)
+        self.assertIs(binds[Bar.__table__], db.get_engine('bar'))
+
+        table = Table(
+            'baz', db.metadata, Column('id', Integer, primary_key=True)
+        )
+
+        try:
+            self.assertIs(db.get_binds()[table], db.engine)
+        finally:
+            db.metadata.remove(table)
+
+
+class DDLTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(
+            url=mysql_url, binds={'foo': mysql_url_1, 'bar': mysql_url_2}
+        )
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def test_parallel(self):
+        report = db.create_all(parallel=True, max_workers=2)
+
+        self.assertEqual(set(report), {None, 'foo', 'bar'})
+        self.assertEqual(report['foo']['tables'], ['foo'])
+        self.assertIsNone(report['bar']['error'])
+
+        with db.get_engine('bar').begin() as conn:
+            conn.execute(text('SELECT COUNT(*) FROM bar'))
+
+        report = db.drop_all(parallel=True)
+
+        self.assertEqual(report['bar']['tables'], ['bar'])
+
+    def test_checkfirst(self):
+        db.create_all(bind='foo')
+
+        report = db.create_all()
+
+        self.assertEqual(report['foo']['tables'], [])
+        self.assertEqual(report['bar']['tables'], ['bar'])
+
+    def test_errors(self):
+        db.create_all(bind='foo')
+
+        report = db.create_all(
+            checkfirst=False, parallel=True, raise_errors=False
+        )
+
+        self.assertIsNotNone(report['foo']['error'])
+        self.assertIsNone(report['bar']['error'])
+
+        with self.assertRaises(Exception):
+            db.create_all(bind=['foo', 'bar'], checkfirst=False, parallel=True)
+
 
 class RequestHandlersTestCase(AsyncHTTPTestCase, TestCase):
     def __init__(self, *args, **kwargs):
@@ -122,3 +197,83 @@ class RequestHandlersTestCase(AsyncHTTPTestCase, TestCase):
 
         self.assertEqual(response.code, HTTPStatus.OK.value)
         self.assertEqual(response.body.decode('utf-8'), '1, 2')
+
+
+class ReplicasTestCase(TestCase):
+    def setUp(self, *args, **kwargs):
+        super(ReplicasTestCase, self).setUp(*args, **kwargs)
+
+        db.configure(
+            url=mysql_url, replicas={None: [mysql_url_1, mysql_url_2]}
+        )
+
+    def _get_bind(self, session, statement):
+        return session.get_bind(mapper=User.__mapper__, clause=statement)
+
+    def test_round_robin(self):
+        sessions = [db.sessionmaker() for _ in range(4)]
+        replicas = db.get_replica_engines()
+
+        binds = [self._get_bind(session, select(User)) for session in sessions]
+
+        self.assertEqual(binds, replicas + replicas)
+        self.assertIs(
+            self._get_bind(sessions[0], select(User).with_for_update()),
+            db.engine,
+        )
+
+        for session in sessions:
+            session.close()
+
+    def test_same_replica_per_transaction(self):
+        with db.sessionmaker() as session:
+            replicas = set()
+
+            session.connection()
+
+            for _ in range(3):
+                replicas.add(self._get_bind(session, select(User)))
+
+            self.assertEqual(len(replicas), 1)
+
+            session.commit()
+
+            self.assertNotEqual(
+                self._get_bind(session, select(User)), replicas.pop()
+            )
+
+    def test_least_connections(self):
+        db.configure(
+            url=mysql_url,
+            replicas={None: [mysql_url_1, mysql_url_2]},
+            replica_strategy='least_connections',
+        )
+
+        session = db.sessionmaker()
+        first, second = db.get_replica_engines()
+
+        with first.connect():
+            self.assertIs(self._get_bind(session, select(User)), second)
+
+        session.close()
+
+    def test_writes_use_primary(self):
+        session = db.sessionmaker()
+
+        session._mark_written()
+        self.assertIs(self._get_bind(session, select(User)), db.engine)
+
+        session.commit()
+        self.assertIsNot(self._get_bind(session, select(User)), db.engine)
+
+        session.close()
+
+    def test_primary_after_write(self):
+        session = db.sessionmaker(primary_after_write=True)
+
+        session._mark_written()
+        session.commit()
+
+        self.assertIs(self._get_bind(session, select(User)), db.engine)
+
+        session.close()
@@ -0,0 +1,136 @@
+import time
+from unittest import TestCase
+
+from sqlalchemy import func, select
+from tornado_sqlalchemy import QueryCache
+
+from ._common import BaseTestCase, User, db
+
+
+class QueryCacheTestCase(TestCase):
+    tables = {(None, 'users')}
+
+    def test_lru(self):
+        cache = QueryCache(max_size=2)
+
+        cache.set('a', 1, self.tables, cache.versions(self.tables))
+        cache.set('b', 2, self.tables, cache.versions(self.tables))
+        cache.get('a')
+        cache.set('c', 3, self.tables, cache.versions(self.tables))
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl(self):
+        cache = QueryCache(ttl=0.01)
+
+        cache.set('a', 1, self.tables, cache.versions(self.tables))
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = QueryCache()
+
+        cache.set('a', 1, self.tables, cache.versions(self.tables))
+        other = {(None, 'other')}
+        cache.set('b', 2, other, cache.versions(other))
+        cache.invalidate(self.tables)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_invalidated_while_running(self):
+        cache = QueryCache()
+
+        versions = cache.versions(self.tables)
+        cache.invalidate(self.tables)
+        cache.set('a', 1, self.tables, versions)
+
+        self.assertIsNone(cache.get('a'))
+
+
+class SessionQueryCacheTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.query_cache.clear()
+
+        with db.sessionmaker() as session:
+            session.add(User('hunter2'))
+            session.commit()
+
+    def _count(self, session, scope):
+        return session.scalar(
+            select(func.count(User.id)).execution_options(cache=scope)
+        )
+
+    def test_request(self):
+        with db.sessionmaker() as session:
+            users = session.query(User).execution_options(cache='request')
+
+            first, second = users.all(), users.all()
+
+            self.assertEqual(first, second)
+            self.assertEqual(session.query_cache.hits, 1)
+
+        with db.sessionmaker() as session:
+            users = session.query(User).execution_options(cache='request')
+
+            users.all()
+            self.assertEqual(session.query_cache.hits, 0)
+
+    def test_flush_invalidates(self):
+        with db.sessionmaker() as session:
+            self.assertEqual(self._count(session, 'request'), 1)
+
+            session.add(User('admin'))
+
+            self.assertEqual(self._count(session, 'request'), 2)
+
+    def test_process(self):
+        with db.sessionmaker() as session:
+            user = session.query(User).execution_options(cache='process').one()
+
+        with db.sessionmaker() as session:
+            cached = (
+                session.query(User).execution_options(cache='process').one()
+            )
+
+            self.assertEqual(db.query_cache.hits, 1)
+            self.assertIsNot(cached, user)
+            self.assertIn(cached, session)
+            self.assertEqual(cached.username, 'hunter2')
+
+    def test_process_with_writes(self):
+        with db.sessionmaker() as session:
+            session.add(User('admin'))
+
+            self.assertEqual(self._count(session, 'process'), 2)
+            self.assertEqual(self._count(session, 'process'), 2)
+            self.assertEqual(session.query_cache.hits, 1)
+
+            with db.sessionmaker() as other:
+                self.assertEqual(self._count(other, 'process'), 1)
+
+            session.rollback()
+
+        self.assertEqual(db.query_cache.hits, 0)
+
+    def test_commit_invalidates(self):
+        with db.sessionmaker() as session:
+            self.assertEqual(self._count(session, 'process'), 1)
+
+        with db.sessionmaker() as session:
+            session.add(User('admin'))
+            session.commit()
+
+        with db.sessionmaker() as session:
+            self.assertEqual(self._count(session, 'process'), 2)
+
+    def test_unknown_scope(self):
+        with db.sessionmaker() as session:
+            with self.assertRaises(ValueError):
+                self._count(session, 'forever')
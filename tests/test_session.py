@@ -1,10 +1,22 @@
 import os
+import threading
+import time
 from unittest import mock
 
+from tornado import gen
 from tornado.testing import AsyncTestCase, gen_test
-from tornado_sqlalchemy import as_future, set_max_workers
+from tornado_sqlalchemy import (
+    DeadlineExceededError,
+    QueueFullError,
+    _async_exec,
+    as_future,
+    as_future_many,
+    set_autoscaling,
+    set_max_queue_size,
+    set_max_workers,
+)
 
-from ._common import db, User, mysql_url
+from ._common import db, User, mysql_url, mysql_url_1, mysql_url_2
 
 set_max_workers(10)
 os.environ['ASYNC_TEST_TIMEOUT'] = '100'
@@ -57,3 +69,253 @@ class ConcurrencyTestCase(AsyncTestCase):
 
         for session in sessions:
             session.close()
+
+
+class BindPoolsTestCase(AsyncTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1, 'bar': mysql_url_2},
+            max_workers={'foo': 2},
+        )
+
+    def test_pool_capacity(self):
+        self.assertEqual(db.get_pool_capacity('bar'), 15)
+
+    def test_default_pool_size(self):
+        # set with `set_max_workers` at the top of this module
+        max_workers = _async_exec._bind_max_workers.pop(None)
+
+        try:
+            db.configure(url=mysql_url)
+            self.assertEqual(_async_exec._get_pool().max_workers, 15)
+
+            db.configure(url=mysql_url, max_workers={None: 3})
+            self.assertEqual(_async_exec._get_pool().max_workers, 3)
+        finally:
+            set_max_workers(max_workers)
+
+    def test_set_max_workers_takes_precedence(self):
+        self.assertEqual(_async_exec._get_pool().max_workers, 10)
+
+        set_max_workers(3, bind='foo')
+
+        try:
+            db.configure(
+                url=mysql_url,
+                binds={'foo': mysql_url_1},
+                max_workers={'foo': 2},
+            )
+
+            self.assertEqual(_async_exec._get_pool('foo').max_workers, 3)
+        finally:
+            del _async_exec._bind_max_workers['foo']
+
+    def test_removed_binds(self):
+        db.configure(url=mysql_url)
+
+        self.assertNotIn('foo', _async_exec._default_max_workers)
+        self.assertNotIn('bar', _async_exec._default_max_workers)
+
+    @gen_test
+    def test_binds_use_separate_pools(self):
+        default_threads = set(
+            (yield [as_future(threading.get_ident) for _ in range(20)])
+        )
+        foo_threads = set(
+            (
+                yield [
+                    as_future(threading.get_ident, bind='foo')
+                    for _ in range(20)
+                ]
+            )
+        )
+
+        self.assertLessEqual(len(foo_threads), 2)
+        self.assertFalse(default_threads & foo_threads)
+
+
+class ResizeTestCase(AsyncTestCase):
+    @gen_test
+    def test_resize_does_not_wait(self):
+        event = threading.Event()
+        future = as_future(event.wait, bind='resize')
+
+        started = time.monotonic()
+        set_max_workers(2, bind='resize')
+
+        self.assertLess(time.monotonic() - started, 1)
+
+        event.set()
+        yield future
+
+    @gen_test
+    def test_queued_work_moves_to_new_workers(self):
+        set_max_workers(1, bind='handover')
+
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def work():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+
+            time.sleep(0.05)
+
+            with lock:
+                running[0] -= 1
+
+        release = threading.Event()
+        futures = [as_future(release.wait, bind='handover')]
+        futures += [as_future(work, bind='handover') for _ in range(2)]
+
+        set_max_workers(2, bind='handover')
+
+        futures += [as_future(work, bind='handover') for _ in range(2)]
+        release.set()
+
+        yield futures
+
+        self.assertLessEqual(peak[0], 2)
+
+    @gen_test
+    def test_autoscaling(self):
+        set_autoscaling(1, 4, bind='autoscaling', interval=0)
+
+        event = threading.Event()
+        futures = [as_future(event.wait, bind='autoscaling') for _ in range(8)]
+
+        self.assertEqual(_async_exec._get_pool('autoscaling').max_workers, 4)
+
+        event.set()
+        yield futures
+
+
+class QueueLimitTestCase(AsyncTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        set_max_workers(1, bind='limited')
+        set_max_queue_size(1, bind='limited')
+
+    def tearDown(self) -> None:
+        set_max_queue_size(None, bind='limited')
+
+        super().tearDown()
+
+    def _block_worker(self):
+        started, release = threading.Event(), threading.Event()
+
+        def work():
+            started.set()
+            return release.wait()
+
+        future = as_future(work, bind='limited')
+        started.wait()
+
+        return future, release
+
+    @gen_test
+    def test_queue_full(self):
+        running, release = self._block_worker()
+        queued = as_future(lambda: 'queued', bind='limited')
+
+        with self.assertRaises(QueueFullError):
+            as_future(lambda: 'rejected', bind='limited')
+
+        waiting = as_future(lambda: 'waited', bind='limited', wait=True)
+
+        release.set()
+
+        self.assertEqual(
+            (yield [running, queued, waiting]), [True, 'queued', 'waited']
+        )
+
+    @gen_test
+    def test_deadline(self):
+        calls = []
+
+        running, release = self._block_worker()
+        expired = as_future(
+            lambda: calls.append('expired'), bind='limited', timeout=0.01
+        )
+
+        time.sleep(0.05)
+        release.set()
+
+        yield running
+
+        with self.assertRaises(DeadlineExceededError):
+            yield expired
+
+        self.assertEqual(calls, [])
+
+    @gen_test
+    def test_waiters_after_deadline(self):
+        running, release = self._block_worker()
+        queued = as_future(lambda: 'queued', bind='limited')
+
+        for _ in range(2):
+            with self.assertRaises(DeadlineExceededError):
+                yield as_future(
+                    lambda: 'expired', bind='limited', wait=True, timeout=0.01
+                )
+
+        waiting = as_future(lambda: 'waited', bind='limited', wait=True)
+
+        # lets the caller start waiting before the worker is released
+        yield gen.sleep(0.01)
+        release.set()
+
+        self.assertEqual(
+            (yield [running, queued, waiting]), [True, 'queued', 'waited']
+        )
+
+
+class BatchTestCase(AsyncTestCase):
+    @gen_test
+    async def test_single_worker(self):
+        threads = set()
+
+        def query(value):
+            threads.add(threading.get_ident())
+            return value
+
+        results = await as_future_many(
+            [lambda: query(1), lambda: query(2), lambda: query(3)]
+        )
+
+        self.assertEqual(results, [1, 2, 3])
+        self.assertEqual(len(threads), 1)
+
+    @gen_test
+    async def test_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def query(value):
+            # only passes if both binds are queried at the same time
+            barrier.wait()
+            return value
+
+        results = await as_future_many(
+            [
+                (lambda: query('foo'), 'foo'),
+                (lambda: 'default', None),
+                (lambda: query('bar'), 'bar'),
+            ],
+            parallel=True,
+        )
+
+        self.assertEqual(results, ['foo', 'default', 'bar'])
+
+    @gen_test
+    async def test_error(self):
+        def fail():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            await as_future_many([lambda: 1, fail])
@@ -1,8 +1,25 @@
-from unittest.mock import Mock
+import threading
+import time
+from unittest.mock import Mock, patch
 
-from tornado_sqlalchemy import MissingDatabaseSettingError, SessionMixin
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from tornado import gen
+from tornado.log import app_log
+from tornado.testing import AsyncTestCase, ExpectLog, gen_test
 
-from ._common import BaseTestCase, User, db
+from tornado_sqlalchemy import (
+    MissingDatabaseSettingError,
+    QueryCancelledError,
+    SessionEx,
+    SessionMixin,
+    SQLAlchemy,
+    as_future,
+    read_only,
+    set_max_workers,
+)
+
+from ._common import BaseTestCase, User, db, mysql_url
 
 
 class SessionMixinTestCase(BaseTestCase):
@@ -55,3 +72,431 @@ class SessionMixinTestCase(BaseTestCase):
         Handler().run()
 
         self.assertEqual(len(sessions), 2)
+
+    def _make_handler(self):
+        class Handler(SessionMixin):
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': db}
+
+            def get(h_self):
+                return h_self.session.query(User).count()
+
+            @read_only
+            def head(h_self):
+                return h_self.session.query(User).count()
+
+        return Handler()
+
+    def test_skip_commit_without_writes(self):
+        handler = self._make_handler()
+        handler.get()
+
+        with patch.object(SessionEx, 'commit') as commit:
+            handler.on_finish()
+
+        commit.assert_not_called()
+
+    def test_commit_with_writes(self):
+        handler = self._make_handler()
+        handler.get()
+
+        handler.session.add(User('hunter2'))
+        self.assertTrue(handler.session.has_writes)
+
+        with patch.object(SessionEx, 'commit') as commit:
+            handler.on_finish()
+
+        commit.assert_called_once_with()
+
+    def test_writes_through_connection(self):
+        handler = self._make_handler()
+
+        handler.session.connection().execute(text('SELECT 1'))
+        self.assertTrue(handler.session.has_writes)
+
+        handler.session.commit()
+        self.assertFalse(handler.session.has_writes)
+
+        handler.session.close()
+
+    def test_read_only(self):
+        handler = self._make_handler()
+
+        self.assertEqual(handler.head(), 0)
+        self.assertTrue(handler.session.read_only)
+        self.assertEqual(
+            handler.session.get_bind().get_execution_options()[
+                'isolation_level'
+            ],
+            'AUTOCOMMIT',
+        )
+
+        handler.on_finish()
+
+
+class SessionPoolTestCase(SessionMixinTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.session_pool_size = 2
+
+    def tearDown(self):
+        db.session_pool_size = 0
+        db._session_pool.clear()
+
+        super().tearDown()
+
+    def test_reuse(self):
+        handler = self._make_handler()
+        handler.head()
+        handler.session.add(User('hunter2'))
+        session = handler.session
+        handler.on_finish()
+
+        handler = self._make_handler()
+        handler.get()
+
+        self.assertIs(handler.session, session)
+        self.assertFalse(session.read_only)
+        self.assertFalse(session.has_writes)
+        self.assertEqual(len(session.identity_map), 0)
+
+        handler.on_finish()
+
+    def test_session_reset(self):
+        session = db.acquire_session(read_only=True)
+        session.add(User('hunter2'))
+
+        # SQLAlchemy's Session.reset is left as is
+        session.reset()
+
+        self.assertTrue(session.read_only)
+        self.assertFalse(session.has_writes)
+
+        db.release_session(session)
+
+    def test_bounded(self):
+        sessions = [db.acquire_session() for _ in range(3)]
+
+        for session in sessions:
+            db.release_session(session)
+
+        self.assertEqual(len(db._session_pool), 2)
+
+    def test_foreign_session(self):
+        other = SQLAlchemy(self.db_url)
+
+        db.release_session(other.sessionmaker())
+
+        self.assertEqual(len(db._session_pool), 0)
+
+
+class ExecutorFinishTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url)
+        db.create_all()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def _make_handler(self, finish_on_executor=False):
+        class Handler(SessionMixin):
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': db}
+                h_self.finish_on_executor = finish_on_executor
+
+        return Handler()
+
+    def _count(self):
+        with db.sessionmaker() as session:
+            return session.query(User).count()
+
+    @gen_test
+    async def test_async_make_session(self):
+        threads = []
+
+        async with self._make_handler().make_session() as session:
+            event.listen(
+                session,
+                'after_commit',
+                lambda session: threads.append(threading.current_thread()),
+            )
+
+            session.add(User('hunter2'))
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertEqual(self._count(), 1)
+
+    @gen_test
+    async def test_async_make_session_error(self):
+        with self.assertRaises(RuntimeError):
+            async with self._make_handler().make_session() as session:
+                session.add(User('hunter2'))
+                session.flush()
+
+                raise RuntimeError()
+
+        self.assertEqual(self._count(), 0)
+
+    @gen_test
+    async def test_async_make_session_commit_error(self):
+        with db.sessionmaker() as session:
+            session.add(User('hunter2'))
+            session.commit()
+
+        with self.assertRaises(IntegrityError):
+            async with self._make_handler().make_session() as session:
+                session.add(User('hunter2'))
+
+    @gen_test
+    async def test_finish_on_executor(self):
+        events = []
+
+        def work():
+            time.sleep(0.05)
+            events.append('work')
+
+        handler = self._make_handler(finish_on_executor=True)
+        handler.session.add(User('hunter2'))
+
+        event.listen(
+            handler.session,
+            'after_commit',
+            lambda session: events.append('commit'),
+        )
+
+        # the commit waits for the work the handler submitted before
+        handler.as_future(work)
+        handler.on_finish()
+
+        self.assertIsNone(handler._session)
+
+        while len(events) < 2:
+            await gen.sleep(0.01)
+
+        self.assertEqual(events, ['work', 'commit'])
+        self.assertEqual(self._count(), 1)
+
+    @gen_test
+    async def test_finish_on_executor_error(self):
+        with db.sessionmaker() as session:
+            session.add(User('hunter2'))
+            session.commit()
+
+        handler = self._make_handler(finish_on_executor=True)
+        handler.session.add(User('hunter2'))
+
+        with ExpectLog(app_log, 'Could not commit the session') as expect:
+            handler.on_finish()
+
+            while not expect.matched:
+                await gen.sleep(0.01)
+
+
+class SerializeWorkTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        set_max_workers(2, bind='affinity')
+        set_max_workers(2, bind='affinity-other')
+
+        self.events = []
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def _make_handler(self):
+        class Handler(SessionMixin):
+            serialize_work = True
+
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': db}
+
+        return Handler()
+
+    def _work(self, name, seconds=0.02):
+        def work():
+            with self.lock:
+                self.running += 1
+                self.events.append((name, self.running))
+
+            time.sleep(seconds)
+
+            with self.lock:
+                self.running -= 1
+            return threading.current_thread()
+
+        return work
+
+    @gen_test
+    async def test_one_at_a_time(self):
+        handler = self._make_handler()
+
+        await gen.multi(
+            [
+                handler.as_future(self._work(name), bind='affinity')
+                for name in range(3)
+            ]
+        )
+
+        self.assertEqual(self.events, [(0, 1), (1, 1), (2, 1)])
+
+    @gen_test
+    async def test_one_at_a_time_across_binds(self):
+        handler = self._make_handler()
+
+        await gen.multi(
+            [
+                handler.as_future(self._work(name), bind=bind)
+                for name, bind in enumerate(
+                    ['affinity', 'affinity-other', 'affinity']
+                )
+            ]
+        )
+
+        self.assertEqual(self.events, [(0, 1), (1, 1), (2, 1)])
+
+    @gen_test
+    async def test_shares_the_workers(self):
+        handlers = [self._make_handler() for _ in range(2)]
+
+        await gen.multi(
+            [
+                handler.as_future(self._work(name), bind='affinity')
+                for name, handler in enumerate(handlers)
+                for _ in range(2)
+            ]
+            + [
+                as_future(self._work('other'), bind='affinity')
+                for _ in range(2)
+            ]
+        )
+
+        self.assertLessEqual(max(running for _, running in self.events), 2)
+        self.assertEqual(len(self.events), 6)
+
+    @gen_test
+    async def test_other_requests_in_parallel(self):
+        first, second = self._make_handler(), self._make_handler()
+
+        threads = await gen.multi(
+            [
+                first.as_future(self._work('first'), bind='affinity'),
+                second.as_future(self._work('second'), bind='affinity'),
+            ]
+        )
+
+        self.assertNotEqual(threads[0], threads[1])
+
+    @gen_test
+    async def test_order_after_shrinking(self):
+        first, second = self._make_handler(), self._make_handler()
+
+        futures = [
+            first.as_future(self._work('first', 0.05), bind='affinity'),
+            second.as_future(self._work('second', 0.05), bind='affinity'),
+        ]
+
+        # the lane of the second handler moves to the new workers
+        set_max_workers(1, bind='affinity')
+
+        futures.append(
+            second.as_future(self._work('second-again'), bind='affinity')
+        )
+
+        await gen.multi(futures)
+
+        names = [name for name, _ in self.events]
+        self.assertLess(names.index('second'), names.index('second-again'))
+
+
+class ConnectionCloseTestCase(AsyncTestCase):
+    infinite_query = text(
+        'WITH RECURSIVE numbers(n) AS '
+        '(SELECT 1 UNION ALL SELECT n + 1 FROM numbers) '
+        'SELECT COUNT(*) FROM numbers'
+    )
+
+    def setUp(self):
+        super().setUp()
+
+        set_max_workers(1, bind='connection-close')
+
+    @gen_test
+    def test_cancel_on_connection_close(self):
+        sqlite_db = SQLAlchemy(
+            'sqlite://',
+            engine_options={'connect_args': {'check_same_thread': False}},
+        )
+
+        class Handler(SessionMixin):
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': sqlite_db}
+
+        handler = Handler()
+        session = handler.session
+
+        running = handler.as_future(
+            lambda: session.execute(self.infinite_query).scalar(),
+            bind='connection-close',
+        )
+        queued = handler.as_future(lambda: 1, bind='connection-close')
+
+        while not any(call.dbapi_connection for call in handler._calls):
+            yield gen.sleep(0.01)
+
+        handler.on_connection_close()
+
+        with self.assertRaises(OperationalError):
+            yield running
+
+        with self.assertRaises(QueryCancelledError):
+            yield queued
+
+        session.close()
+
+    @gen_test
+    def test_forget_connection_after_statement(self):
+        sqlite_db = SQLAlchemy(
+            'sqlite://',
+            engine_options={'connect_args': {'check_same_thread': False}},
+        )
+
+        class Handler(SessionMixin):
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': sqlite_db}
+
+        handler = Handler()
+        session = handler.session
+        executed, release = threading.Event(), threading.Event()
+
+        def work():
+            session.execute(text('SELECT 1'))
+            session.close()
+
+            executed.set()
+            release.wait()
+
+        future = handler.as_future(work, bind='connection-close')
+
+        while not executed.is_set():
+            yield gen.sleep(0.01)
+
+        try:
+            # the connection is back in the pool and must not be interrupted
+            self.assertEqual(
+                [call.dbapi_connection for call in handler._calls], [None]
+            )
+        finally:
+            release.set()
+
+        yield future
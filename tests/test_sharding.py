@@ -0,0 +1,226 @@
+import threading
+from unittest import TestCase
+
+from sqlalchemy import Integer, Column, String, inspect, select, text
+from tornado.testing import AsyncTestCase, gen_test
+from tornado_sqlalchemy import SQLAlchemy
+from tornado_sqlalchemy import ShardKeyError, as_future
+
+from ._common import mysql_url, mysql_url_1, mysql_url_2
+
+
+db = SQLAlchemy()
+
+
+class Event(db.Model):
+    __tablename__ = 'events'
+    __shard_key__ = 'tenant_id'
+    __shard_binds__ = ('foo', 'bar')
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer)
+    name = Column(String(64))
+
+    def __shard_resolver__(tenant_id):
+        return ('foo', 'bar')[tenant_id % 2]
+
+    def __init__(self, id, tenant_id, name=None):
+        self.id = id
+        self.tenant_id = tenant_id
+        self.name = name
+
+
+class ShardingTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(
+            url=mysql_url, binds={'foo': mysql_url_1, 'bar': mysql_url_2}
+        )
+        db.create_all()
+
+        with db.sessionmaker() as session:
+            session.add_all(Event(id, id) for id in range(1, 5))
+            session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def _ids(self, bind):
+        with db.get_engine(bind).connect() as conn:
+            return [
+                row[0]
+                for row in conn.execute(
+                    text('SELECT tenant_id FROM events ORDER BY tenant_id')
+                )
+            ]
+
+    def test_flush(self):
+        self.assertEqual(self._ids('foo'), [2, 4])
+        self.assertEqual(self._ids('bar'), [1, 3])
+        self.assertEqual(db.get_shard(Event, 3), 'bar')
+
+    def test_filtered(self):
+        with db.sessionmaker() as session:
+            (event,) = session.query(Event).filter(Event.tenant_id == 3)
+
+            self.assertEqual(inspect(event).identity_token, 'bar')
+
+            events = (
+                session.query(Event)
+                .filter(Event.tenant_id.in_([1, 2]), Event.name.is_(None))
+                .all()
+            )
+
+            self.assertEqual(sorted(e.tenant_id for e in events), [1, 2])
+
+    def test_fan_out(self):
+        with db.sessionmaker() as session:
+            events = session.query(Event).all()
+
+            self.assertEqual(sorted(e.tenant_id for e in events), [1, 2, 3, 4])
+            self.assertTrue(all(e in session for e in events))
+
+    def test_same_primary_key(self):
+        with db.sessionmaker() as session:
+            session.add_all([Event(10, 5), Event(10, 6)])
+            session.commit()
+
+        with db.sessionmaker() as session:
+            events = session.query(Event).filter(Event.id == 10).all()
+
+            self.assertEqual(sorted(e.tenant_id for e in events), [5, 6])
+
+    def test_update(self):
+        with db.sessionmaker() as session:
+            for event in session.query(Event):
+                event.name = 'tenant {}'.format(event.tenant_id)
+            session.commit()
+
+        with db.get_engine('bar').connect() as conn:
+            names = conn.execute(text('SELECT name FROM events')).all()
+
+        self.assertEqual(sorted(names), [('tenant 1',), ('tenant 3',)])
+
+    def test_pending_writes(self):
+        with db.sessionmaker() as session:
+            session.add(Event(5, 5))
+
+            self.assertEqual(len(session.query(Event).all()), 5)
+
+    def test_missing_shard_key(self):
+        with db.sessionmaker() as session:
+            session.add(Event(5, None))
+
+            with self.assertRaises(ShardKeyError):
+                session.commit()
+
+
+class FanOutTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1, 'bar': mysql_url_2},
+            max_workers={'foo': 1, 'bar': 1},
+        )
+        db.create_all()
+
+        with db.sessionmaker() as session:
+            session.add_all(Event(id, id) for id in range(1, 5))
+            session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def _tenants(self):
+        with db.sessionmaker() as session:
+            return sorted(e.tenant_id for e in session.query(Event).all())
+
+    @gen_test
+    async def test_from_shard_pool(self):
+        self.assertEqual(
+            await as_future(self._tenants, bind='foo', db=db), [1, 2, 3, 4]
+        )
+
+    @gen_test
+    async def test_busy_pool(self):
+        release = threading.Event()
+        busy = as_future(release.wait, bind='bar')
+
+        try:
+            tenants = await as_future(self._tenants, bind='foo', db=db)
+        finally:
+            release.set()
+
+        await busy
+
+        self.assertEqual(tenants, [1, 2, 3, 4])
+
+    @gen_test
+    async def test_from_ioloop(self):
+        self.assertEqual(self._tenants(), [1, 2, 3, 4])
+
+
+class ShardedBulkTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(
+            url=mysql_url, binds={'foo': mysql_url_1, 'bar': mysql_url_2}
+        )
+        db.create_all()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def _ids(self, bind):
+        with db.get_engine(bind).connect() as conn:
+            return [
+                row[0]
+                for row in conn.execute(
+                    text('SELECT tenant_id FROM events ORDER BY tenant_id')
+                )
+            ]
+
+    @gen_test
+    async def test_bulk_insert(self):
+        written = await db.bulk_insert(
+            Event, [{'id': id, 'tenant_id': id} for id in range(1, 6)]
+        )
+
+        self.assertEqual(written, 5)
+        self.assertEqual(self._ids('foo'), [2, 4])
+        self.assertEqual(self._ids('bar'), [1, 3, 5])
+
+    @gen_test
+    async def test_bulk_upsert(self):
+        await db.bulk_upsert(
+            Event, [{'id': 1, 'tenant_id': 1}, {'id': 2, 'tenant_id': 2}]
+        )
+
+        self.assertEqual(self._ids('foo'), [2])
+        self.assertEqual(self._ids('bar'), [1])
+
+    @gen_test
+    async def test_bulk_missing_shard_key(self):
+        with self.assertRaises(ShardKeyError):
+            await db.bulk_insert(Event, [{'id': 1}])
+
+    @gen_test
+    async def test_coalesce(self):
+        await db.bulk_insert(Event, [{'id': 1, 'tenant_id': 1}])
+
+        statement = select(Event.tenant_id)
+
+        with self.assertRaises(ShardKeyError):
+            db.coalesce(statement)
+
+        self.assertEqual(await db.coalesce(statement, bind='bar'), [(1,)])
@@ -0,0 +1,142 @@
+import contextvars
+from unittest.mock import Mock
+
+from sqlalchemy import text
+from tornado.testing import AsyncTestCase, gen_test
+
+from tornado_sqlalchemy import SessionMixin, SlowQueryLog
+
+from ._common import User, db, mysql_url
+
+
+class SlowQueryLogTestCase(AsyncTestCase):
+    def _configure(self, connection_budget=None, **kwargs):
+        self.log = SlowQueryLog(**kwargs)
+
+        db.configure(
+            url=mysql_url,
+            slow_query_log=self.log,
+            connection_budget=connection_budget,
+        )
+        db.create_all()
+
+        self.log.clear()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    def _make_handler(self):
+        class UsersHandler(SessionMixin):
+            def __init__(h_self):
+                h_self.application = Mock()
+                h_self.application.settings = {'db': db}
+                h_self.request = Mock(uri='/users?page=2')
+
+        return UsersHandler()
+
+    @gen_test
+    async def test_handler_and_queue_wait(self):
+        self._configure(
+            threshold=0, explain_threshold=0, explain_sample_rate=1
+        )
+
+        handler = self._make_handler()
+        session = handler.session
+
+        count = await handler.as_future(session.query(User).count)
+        handler.on_finish()
+
+        self.assertEqual(count, 0)
+
+        [entry] = self.log.entries()
+
+        self.assertIn('SELECT', entry['statement'])
+        self.assertIsNone(entry['bind'])
+        self.assertGreaterEqual(entry['duration'], 0)
+        self.assertGreaterEqual(entry['queue_wait'], 0)
+        self.assertTrue(entry['handler'].endswith('.UsersHandler'))
+        self.assertEqual(entry['uri'], '/users?page=2')
+        self.assertTrue(entry['explain'])
+
+    def test_outside_of_handlers(self):
+        self._configure(threshold=0)
+
+        def run():
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+
+        contextvars.Context().run(run)
+
+        [entry] = self.log.entries()
+
+        self.assertIsNone(entry['handler'])
+        self.assertIsNone(entry['uri'])
+        self.assertIsNone(entry['queue_wait'])
+        self.assertIsNone(entry['explain'])
+
+    def test_explain_on_separate_connection(self):
+        self._configure(
+            threshold=0, explain_threshold=0, explain_sample_rate=1
+        )
+
+        with db.sessionmaker() as session:
+            session.add(User('hunter2'))
+            session.flush()
+
+            self.assertEqual(session.query(User).count(), 1)
+            session.commit()
+
+        self.assertTrue(self.log.entries()[-1]['explain'])
+        self.assertEqual(db.engine.pool.checkedout(), 0)
+
+    def test_explain_without_spare_connection(self):
+        self._configure(
+            connection_budget=1,
+            threshold=0,
+            explain_threshold=0,
+            explain_sample_rate=1,
+        )
+
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+        self.assertIsNone(self.log.entries()[-1]['explain'])
+
+    def test_threshold(self):
+        self._configure(threshold=60)
+
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+        self.assertEqual(len(self.log), 0)
+
+    def test_redact_parameters(self):
+        self._configure(threshold=0, redact_parameters=True)
+
+        with db.sessionmaker() as session:
+            session.query(User).filter(User.username == 'hunter2').all()
+
+        self.assertIsNone(self.log.entries()[-1]['parameters'])
+
+        self._configure(
+            threshold=0, redact_parameters=lambda parameters: '<redacted>'
+        )
+
+        with db.sessionmaker() as session:
+            session.query(User).filter(User.username == 'hunter2').all()
+
+        self.assertEqual(self.log.entries()[-1]['parameters'], '<redacted>')
+
+    def test_max_size(self):
+        self._configure(threshold=0, max_size=2)
+
+        with db.engine.connect() as connection:
+            for value in range(3):
+                connection.execute(text('SELECT {}'.format(value)))
+
+        self.assertEqual(
+            [entry['statement'] for entry in self.log.entries()],
+            ['SELECT 1', 'SELECT 2'],
+        )
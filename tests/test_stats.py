@@ -0,0 +1,86 @@
+from unittest import mock
+
+from sqlalchemy import text
+from tornado.testing import AsyncTestCase, gen_test
+from tornado_sqlalchemy import SQLAlchemy, as_future
+
+from ._common import BaseTestCase, User, db, mysql_url, mysql_url_1
+
+
+class StatsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.stats.reset()
+
+    def test_statement_and_checkout(self):
+        with db.sessionmaker() as session:
+            session.add(User('hunter2'))
+            session.commit()
+
+            self.assertEqual(session.query(User).count(), 1)
+
+        stats = db.get_stats()
+
+        self.assertGreaterEqual(stats['statement']['count'], 2)
+        self.assertGreaterEqual(stats['checkout']['count'], 1)
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertEqual(stats['overflow'], 0)
+
+    def test_checked_out(self):
+        with db.engine.connect():
+            self.assertEqual(db.get_stats()['checked_out'], 1)
+
+    def test_checkout_after_dispose(self):
+        db.engine.dispose()
+        db.stats.reset()
+
+        with db.engine.connect():
+            pass
+
+        self.assertEqual(db.get_stats()['checkout']['count'], 1)
+
+    def test_listener(self):
+        listener = mock.Mock()
+        db.stats.add_listener(listener)
+
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        finally:
+            db.stats.remove_listener(listener)
+
+        metrics = [args[1] for args, _ in listener.call_args_list]
+        self.assertIn('checkout', metrics)
+        self.assertIn('statement', metrics)
+
+
+class ExecutorStatsTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url, binds={'foo': mysql_url_1})
+        db.stats.reset()
+
+    @gen_test
+    async def test_queue_wait_and_run(self):
+        await as_future(lambda: None, db=db)
+        await as_future(lambda: None, bind='foo', db=db)
+        await as_future(lambda: None, bind='foo', db=db)
+
+        default, foo = db.get_stats(), db.get_stats('foo')
+
+        self.assertEqual(default['queue_wait']['count'], 1)
+        self.assertEqual(default['run']['count'], 1)
+        self.assertEqual(foo['queue_wait']['count'], 2)
+        self.assertEqual(foo['run']['count'], 2)
+
+    @gen_test
+    async def test_other_instance(self):
+        other = SQLAlchemy(url=mysql_url)
+
+        await as_future(lambda: None, db=db)
+        await as_future(lambda: None, db=other)
+
+        self.assertEqual(db.get_stats()['run']['count'], 1)
+        self.assertEqual(other.get_stats()['run']['count'], 1)
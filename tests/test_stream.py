@@ -0,0 +1,84 @@
+import threading
+
+from sqlalchemy import select
+from tornado.testing import AsyncTestCase, gen_test
+from tornado_sqlalchemy import as_stream
+
+from ._common import User, db, mysql_url
+
+
+class StreamTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url)
+        db.create_all()
+
+        with db.sessionmaker() as session:
+            session.add_all(User('User #{}'.format(i)) for i in range(25))
+            session.commit()
+
+    def tearDown(self):
+        db.drop_all()
+
+        super().tearDown()
+
+    @gen_test
+    async def test_query(self):
+        with db.sessionmaker() as session:
+            chunks = [
+                chunk
+                async for chunk in as_stream(
+                    session.query(User).order_by(User.id), chunk_size=10
+                )
+            ]
+
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        self.assertEqual(chunks[2][-1].username, 'User #24')
+
+    @gen_test
+    async def test_result(self):
+        with db.sessionmaker() as session:
+            statement = select(User.username).execution_options(yield_per=10)
+
+            chunks = [
+                chunk
+                async for chunk in as_stream(
+                    lambda: session.execute(statement), chunk_size=10
+                )
+            ]
+
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 25)
+
+    @gen_test
+    async def test_backpressure(self):
+        fetched = []
+        released = threading.Event()
+
+        def rows():
+            for row in range(100):
+                fetched.append(row)
+                yield row
+
+        stream = as_stream(rows, chunk_size=10, buffer_size=1)
+
+        await stream.__anext__()
+
+        # the worker can only fetch one more chunk ahead of the handler
+        await self.io_loop.run_in_executor(None, released.wait, 0.1)
+        self.assertLessEqual(len(fetched), 21)
+
+        await stream.aclose()
+
+    @gen_test
+    async def test_error(self):
+        def rows():
+            yield from range(10)
+            raise ValueError()
+
+        stream = as_stream(rows, chunk_size=10)
+
+        self.assertEqual(await stream.__anext__(), list(range(10)))
+
+        with self.assertRaises(ValueError):
+            await stream.__anext__()
@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from tornado.testing import AsyncTestCase, gen_test
+
+from tornado_sqlalchemy import CircuitOpenError
+
+from ._common import db, mysql_url, mysql_url_1
+
+
+class WarmUpTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1},
+            engine_options={'pool_size': 3},
+        )
+
+    def test_fills_pools(self):
+        self.assertEqual(db.warm_up(validate=True), {None: 3, 'foo': 3})
+
+        for bind in (None, 'foo'):
+            pool = db.get_engine(bind).pool
+
+            self.assertEqual(pool.checkedin(), 3)
+            self.assertEqual(pool.checkedout(), 0)
+
+    def test_connections(self):
+        self.assertEqual(db.warm_up(connections=2), {None: 2, 'foo': 2})
+
+    def test_no_connections(self):
+        self.assertEqual(db.warm_up(connections=0), {None: 0, 'foo': 0})
+
+
+class AsyncWarmUpTestCase(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+
+        db.configure(url=mysql_url, engine_options={'pool_size': 2})
+
+    @gen_test
+    async def test_fills_pools(self):
+        self.assertEqual(await db.async_warm_up(validate=True), {None: 2})
+        self.assertEqual(db.engine.pool.checkedin(), 2)
+
+    @gen_test
+    async def test_circuit_open(self):
+        db.configure(
+            url=mysql_url,
+            binds={'foo': mysql_url_1},
+            engine_options={'pool_size': 2},
+            circuit_breaker_threshold=1,
+        )
+        db.get_circuit_breaker('foo').record_failure()
+
+        with self.assertRaises(CircuitOpenError):
+            await db.async_warm_up()
+
+        self.assertEqual(db.engine.pool.checkedin(), 2)
+        self.assertEqual(db.engine.pool.checkedout(), 0)
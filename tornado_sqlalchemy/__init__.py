@@ -1,166 +1,2467 @@
+import collections
+import concurrent.futures
+import contextvars
+import functools
+import itertools
 import multiprocessing
+import os
+import random
+import threading
+import time
+import weakref
+import zlib
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import contextmanager
-from typing import Callable, Iterator, Optional
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from sqlalchemy import Table, create_engine, event, exc, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine, FrozenResult, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.declarative import DeclarativeMeta
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import Query, merge_frozen_result, sessionmaker
+from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import (
+    BinaryExpression,
+    BindParameter,
+    BooleanClauseList,
+    ColumnElement,
+    Grouping,
+)
+from sqlalchemy.sql.util import find_tables
+from sqlalchemy.util import LRUCache
+from tornado import gen, queues
+from tornado.concurrent import (
+    Future,
+    chain_future,
+    future_set_exception_unless_cancelled,
+)
+from tornado.ioloop import IOLoop
+from tornado.log import app_log
+
+
+__all__ = (
+    'as_future',
+    'as_future_many',
+    'as_stream',
+    'AsyncSessionMixin',
+    'CircuitBreaker',
+    'QueryCache',
+    'read_only',
+    'SessionMixin',
+    'set_autoscaling',
+    'set_max_queue_size',
+    'set_max_workers',
+    'SlowQueryLog',
+    'SQLAlchemy',
+)
+
+
+_WorkerCount = Union[int, Callable[[], Optional[int]]]
+
+# a callable, or a (callable, bind key) pair
+_Query = Union[Callable, Tuple[Callable, Optional[str]]]
+
+# (min_workers, max_workers, target_queue_wait, interval)
+_Autoscaling = Tuple[int, int, float, float]
+
+# weight of the latest sample in the moving average of the queue wait time
+_QUEUE_WAIT_DECAY = 0.2
+
+_REPLICA_STRATEGIES = ('round_robin', 'least_connections')
+
+_TABLES_VERSION_KEY = 'tornado_sqlalchemy.tables_version'
+
+_SHARDED_KEY = 'tornado_sqlalchemy.sharded'
+
+_CACHE_SCOPES = ('request', 'process')
+
+# (bind key, table name)
+_TableKey = Tuple[Optional[str], str]
+
+
+class MissingFactoryError(Exception):
+    pass
+
+
+class MissingDatabaseSettingError(Exception):
+    pass
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+class QueryCancelledError(Exception):
+    pass
+
+
+class ShardKeyError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# keeps track of the `_Call` a worker thread is currently running
+_worker_state = threading.local()
+
+# the `SessionMixin` request handler the current request is served by
+_current_handler = contextvars.ContextVar(
+    'tornado_sqlalchemy.handler', default=None
+)
+
+
+def _interrupt(dbapi_connection) -> bool:
+    """Asks the driver to abort the statement running on a DBAPI connection,
+    for drivers supporting it (e.g. `interrupt` in sqlite3, `cancel` in
+    psycopg2).
+    """
+    for name in ('interrupt', 'cancel'):
+        method = getattr(dbapi_connection, name, None)
+
+        if method is not None:
+            method()
+            return True
+
+    return False
+
+
+def _track_dbapi_connection(
+    conn, cursor, statement, parameters, context, executemany
+):
+    call = getattr(_worker_state, 'call', None)
+
+    if call is not None:
+        call.dbapi_connection = conn.connection.dbapi_connection
+
+
+def _untrack_dbapi_connection(conn, *args):
+    # the connection can go back to the pool before the call is done, so
+    # it is only interrupted while one of its statements is running
+    call = getattr(_worker_state, 'call', None)
+
+    if call is not None:
+        call.dbapi_connection = None
+
+
+def _run_all(queries: Sequence[Callable]) -> list:
+    return [query() for query in queries]
+
+
+class _Call:
+    """A piece of work submitted through `as_future`, which can be cancelled
+    while it's still queued, or interrupted while it's running a statement.
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        deadline: Optional[float] = None,
+        stats: Optional['Stats'] = None,
+        bind: Optional[str] = None,
+    ):
+        self.fn = fn
+        self.deadline = deadline
+        self.stats = stats
+        self.bind = bind
+        self.io_loop: Optional[IOLoop] = None
+        self.cancelled = False
+        self.future: Optional[concurrent.futures.Future] = None
+        self.dbapi_connection = None
+        self.queue_wait: Optional[float] = None
+
+        # the work runs with the context variables of the code submitting it
+        self.context = contextvars.copy_context()
+
+    def cancel(self):
+        self.cancelled = True
+
+        if self.future is None or self.future.cancel():
+            return
+
+        dbapi_connection = self.dbapi_connection
+        if dbapi_connection is not None:
+            _interrupt(dbapi_connection)
+
+
+class Timing:
+    """Number, total and maximum of the durations (in seconds) recorded for a
+    metric.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+        self._lock = threading.Lock()
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.mean,
+            'max': self.max,
+        }
+
+
+class Stats:
+    """Timings recorded per bind key, for the `as_future` work and the engines
+    of a `SQLAlchemy` object.
+
+    The metrics are `queue_wait` and `run` (time `as_future` work spent
+    waiting for a worker and running), `checkout` (time spent getting a
+    connection from the engine's pool), and `statement` (time spent executing
+    each statement).
+
+    Listeners added with `add_listener` are called with `(bind, metric,
+    seconds)` for every duration recorded, from whichever thread recorded it.
+    """
+
+    def __init__(self):
+        self._timings: Dict[Tuple[Optional[str], str], Timing] = {}
+        self._listeners: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable):
+        self._listeners.remove(listener)
+
+    def record(self, bind: Optional[str], metric: str, seconds: float):
+        timing = self._timings.get((bind, metric))
+
+        if timing is None:
+            with self._lock:
+                timing = self._timings.setdefault((bind, metric), Timing())
+
+        timing.record(seconds)
+
+        for listener in self._listeners:
+            listener(bind, metric, seconds)
+
+    def get(self, bind: Optional[str] = None) -> Dict[str, Timing]:
+        """Returns the timings recorded for a bind key, by metric."""
+        return {
+            metric: timing
+            for (key, metric), timing in list(self._timings.items())
+            if key == bind
+        }
+
+    def reset(self):
+        with self._lock:
+            self._timings = {}
+
+
+class SlowQueryLog:
+    """Ring buffer of the last `max_size` statements which took more than
+    `threshold` seconds to execute.
+
+    Each entry is a dictionary with the statement, its parameters, the bind
+    key, how long it took, how long the `as_future` work running it waited
+    for a worker, and the class and URI of the request handler it was run
+    for. `redact_parameters` either drops the parameters (True), or is a
+    callable returning the parameters to record instead.
+
+    Out of the statements taking more than `explain_threshold` seconds, a
+    fraction of `explain_sample_rate` is run again with `EXPLAIN`, and its
+    output is added to the entry.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        max_size: int = 1000,
+        explain_threshold: Optional[float] = None,
+        explain_sample_rate: float = 0.0,
+        redact_parameters: Union[bool, Callable] = False,
+    ):
+        self.threshold = threshold
+        self.explain_threshold = explain_threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.redact_parameters = redact_parameters
+
+        self._entries: Deque[dict] = collections.deque(maxlen=max_size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entries(self) -> List[dict]:
+        """Returns the entries in the log, oldest first."""
+        return list(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def should_explain(self, statement: str, seconds: float) -> bool:
+        return (
+            self.explain_threshold is not None
+            and seconds >= self.explain_threshold
+            and statement.lstrip()[:6].upper() in ('SELECT', 'WITH')
+            and random.random() < self.explain_sample_rate
+        )
+
+    def record(
+        self,
+        statement: str,
+        parameters,
+        bind: Optional[str],
+        seconds: float,
+        explain: Optional[list] = None,
+    ):
+        if self.redact_parameters is True:
+            parameters = None
+        elif self.redact_parameters:
+            parameters = self.redact_parameters(parameters)
+
+        call = getattr(_worker_state, 'call', None)
+        handler = _current_handler.get()
+        request = getattr(handler, 'request', None)
+
+        self._entries.append(
+            {
+                'time': time.time(),
+                'statement': statement,
+                'parameters': parameters,
+                'bind': bind,
+                'duration': seconds,
+                'queue_wait': call.queue_wait if call is not None else None,
+                'handler': (
+                    '{}.{}'.format(
+                        type(handler).__module__, type(handler).__qualname__
+                    )
+                    if handler is not None
+                    else None
+                ),
+                'uri': getattr(request, 'uri', None),
+                'explain': explain,
+            }
+        )
+
+
+class CircuitBreaker:
+    """Fails fast while the database of a bind is unreachable.
+
+    After `failure_threshold` connection or operational errors in a row, the
+    circuit opens, and work for the bind fails with `CircuitOpenError` instead
+    of waiting on the database. After `reset_timeout` seconds, a single
+    connection is let through as a probe (half-open). The circuit closes once
+    a statement succeeds, and opens again if the probe fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.trips = 0
+
+        self._opened_at = 0.0
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether work should fail fast, either because the circuit is open,
+        or because it's half-open and a probe is already on its way.
+        """
+        if self.state == 'closed':
+            return False
+
+        since = self._opened_at if self.state == 'open' else self._probed_at
+        return time.monotonic() - since < self.reset_timeout
+
+    def check(self):
+        if self.is_open:
+            raise CircuitOpenError()
+
+    def probe(self):
+        """Called before using a connection, letting it through as the probe
+        if the circuit isn't closed.
+        """
+        if self.state == 'closed':
+            return
+
+        with self._lock:
+            self.check()
+
+            self.state = 'half_open'
+            self._probed_at = time.monotonic()
+
+    def record_success(self):
+        if self.state == 'closed' and not self.failures:
+            return
+
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+            if self.state == 'open':
+                return
+
+            if (
+                self.state == 'half_open'
+                or self.failures >= self.failure_threshold
+            ):
+                self.state = 'open'
+                self.trips += 1
+                self._opened_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, Union[str, int]]:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+        }
+
+
+class QueryCache:
+    """LRU cache for the results of queries, holding at most `max_size`
+    results for at most `ttl` seconds (None means forever).
+
+    Results are kept along with the tables they were read from, so that they
+    can be invalidated once one of these tables is written to.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (expiry, frozen result, tables)
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._keys_by_table: Dict[_TableKey, Set] = collections.defaultdict(
+            set
+        )
+        self._versions: Dict[_TableKey, int] = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key) -> Optional[FrozenResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+            return entry[1]
+
+    def versions(self, tables: Set[_TableKey]) -> Tuple[int, ...]:
+        """Returns a token to pass to `set`, taken before running a query."""
+        with self._lock:
+            return tuple(self._versions[table] for table in sorted(tables))
+
+    def set(
+        self,
+        key,
+        result: FrozenResult,
+        tables: Set[_TableKey],
+        versions: Tuple[int, ...],
+    ):
+        """Stores the result of a query, unless one of the tables it read
+        from was invalidated after `versions` was taken.
+        """
+        expiry = float('inf')
+        if self.ttl is not None:
+            expiry = time.monotonic() + self.ttl
+
+        with self._lock:
+            if versions != tuple(
+                self._versions[table] for table in sorted(tables)
+            ):
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (expiry, result, tables)
+            for table in tables:
+                self._keys_by_table[table].add(key)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tables: Set[_TableKey]):
+        """Drops the results read from any of the given tables."""
+        with self._lock:
+            for table in tables:
+                self._versions[table] += 1
+
+                for key in list(self._keys_by_table.pop(table, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for table in list(self._keys_by_table):
+                self._versions[table] += 1
+
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def _remove(self, key):
+        _, _, tables = self._entries.pop(key)
+
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+
+
+class CompiledCache(LRUCache):
+    """Cache for compiled statements, which can be shared by several engines
+    (see the `compiled_cache_size` setting), and which keeps track of its hit
+    rate.
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = super().get(key)
+
+        if value is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+            'capacity': self.capacity,
+        }
+
+
+def _run_future(future: concurrent.futures.Future, fn: Callable, args):
+    # work cancelled while still queued is skipped
+    if not future.set_running_or_notify_cancel():
+        return
+
+    try:
+        result = fn(*args)
+    except BaseException as error:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _Lane:
+    """The work a request submitted to the `_WorkerPool`s, which their
+    workers run one piece at a time, in order, whichever pool (i.e. bind) each
+    piece was submitted to. Only one worker is taken up by a lane at a time,
+    and only for one piece of work, so that lanes share the workers with the
+    rest of the pools. Consecutive pieces of work may run on different
+    workers.
+    """
+
+    def __init__(self):
+        self._pending: Deque[
+            Tuple['_WorkerPool', concurrent.futures.Future, Callable, tuple]
+        ] = collections.deque()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def submit(
+        self, pool: '_WorkerPool', fn: Callable, *args
+    ) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        with self._lock:
+            self._pending.append((pool, future, fn, args))
+
+            if self._running:
+                return future
+            self._running = True
+
+        pool._execute(self._run_next)
+
+        return future
+
+    def _run_next(self):
+        while True:
+            with self._lock:
+                _, future, fn, args = self._pending.popleft()
+
+            _run_future(future, fn, args)
+
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+
+                pool = self._pending[0][0]
+
+            # the next piece of work queues up behind the work of the other
+            # requests on its pool, unless that was shut down in the meantime
+            try:
+                pool._execute(self._run_next)
+            except RuntimeError:
+                continue
+
+            return
+
+
+class _WorkerPool:
+    """Wrapper around ThreadPoolExecutor which keeps track of the work waiting
+    for a worker, and which can be resized without waiting on running work.
+
+    The work waiting for a worker is queued by the pool itself rather than by
+    the executor, so that it's picked up by the new executor after resizing,
+    instead of by the threads of the old one.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.queued = 0
+        self.queue_wait = 0.0
+        self.autoscaling: Optional[_Autoscaling] = None
+        self.max_queue_size: Optional[int] = None
+        self.bind: Optional[str] = None
+
+        self._last_scaled = time.monotonic()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._queue: Deque[
+            Tuple[concurrent.futures.Future, Callable, tuple]
+        ] = collections.deque()
+        self._waiters: Deque[Future] = collections.deque()
+
+    @property
+    def is_full(self) -> bool:
+        return (
+            self.max_queue_size is not None
+            and self.queued >= self.max_queue_size
+        )
+
+    def submit(
+        self, call: _Call, lane: Optional[_Lane] = None
+    ) -> concurrent.futures.Future:
+        """Submits work to any of the workers, or if `lane` is given, behind
+        the work already submitted to the lane.
+        """
+        if self.autoscaling:
+            self._autoscale()
+
+        with self._lock:
+            self.queued += 1
+
+        if lane is None:
+            call.future = self._execute(self._run, call, time.monotonic())
+        else:
+            call.future = lane.submit(self, self._run, call, time.monotonic())
+
+        call.future.add_done_callback(self._on_done)
+
+        return call.future
+
+    async def wait_for_slot(self, deadline: Optional[float] = None):
+        """Waits (without blocking the IOLoop) until the queue has room for
+        another piece of work, or until `deadline` passes.
+        """
+        while self.is_full:
+            waiter = Future()  # type: Future
+            self._waiters.append(waiter)
+
+            if deadline is None:
+                await waiter
+                continue
+
+            io_loop = IOLoop.current()
+            try:
+                await gen.with_timeout(
+                    io_loop.time() + deadline - time.monotonic(), waiter
+                )
+            except gen.TimeoutError:
+                raise DeadlineExceededError()
+            finally:
+                # so that `wake_waiter` skips it, if this caller gave up
+                if not waiter.done():
+                    waiter.cancel()
+
+    def wake_waiter(self):
+        # called on the IOLoop whenever a piece of work completes, since that
+        # means a worker picked up the next piece of work in the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def resize(self, max_workers: int):
+        if max_workers == self.max_workers:
+            return
+
+        with self._lock:
+            executor = self._executor
+
+            self.max_workers = max_workers
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+            # the work that hasn't started yet moves to the new executor
+            for _ in self._queue:
+                self._executor.submit(self._run_next, self._executor)
+
+        # work already running on the old executor still runs to completion,
+        # we just don't wait for it here
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _execute(self, fn: Callable, *args) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        with self._lock:
+            self._queue.append((future, fn, args))
+
+            try:
+                self._executor.submit(self._run_next, self._executor)
+            except RuntimeError:
+                self._queue.pop()
+                raise
+
+        return future
+
+    def _run_next(self, executor: ThreadPoolExecutor):
+        with self._lock:
+            # the pool was resized since, and the new executor took over
+            if executor is not self._executor or not self._queue:
+                return
+
+            future, fn, args = self._queue.popleft()
+
+        _run_future(future, fn, args)
+
+    def _run(self, call: _Call, submitted: float):
+        now = time.monotonic()
+        stats = call.stats
+
+        call.queue_wait = now - submitted
+
+        with self._lock:
+            self.queued -= 1
+            self.queue_wait += (
+                call.queue_wait - self.queue_wait
+            ) * _QUEUE_WAIT_DECAY
+
+        if stats is not None:
+            stats.record(self.bind, 'queue_wait', now - submitted)
+
+        if call.cancelled:
+            raise QueryCancelledError()
+
+        if call.deadline is not None and now > call.deadline:
+            raise DeadlineExceededError()
+
+        _worker_state.call = call
+        try:
+            return call.context.run(call.fn)
+        finally:
+            _worker_state.call = None
+            call.dbapi_connection = None
+
+            if stats is not None:
+                stats.record(self.bind, 'run', time.monotonic() - now)
+
+    def _on_done(self, future: concurrent.futures.Future):
+        # work cancelled while still in the queue never reaches `_run`
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def _autoscale(self):
+        min_workers, max_workers, target_queue_wait, interval = (
+            self.autoscaling
+        )
+
+        now = time.monotonic()
+        if now - self._last_scaled < interval:
+            return
+        self._last_scaled = now
+
+        if self.queued >= self.max_workers or (
+            self.queued and self.queue_wait > target_queue_wait
+        ):
+            count = self.max_workers + self.queued
+        elif not self.queued and self.queue_wait < target_queue_wait / 2:
+            count = self.max_workers - 1
+        else:
+            return
+
+        self.resize(max(min_workers, min(max_workers, count)))
+
+
+class _AsyncExecution:
+    """Tiny wrapper around ThreadPoolExecutor. This class is not meant to be
+    instantiated externally, but internally we just use it as a wrapper around
+    ThreadPoolExecutor so we can control the pool size and make the
+    `as_future` function public.
+
+    Work submitted for a bind key runs on a pool of its own, so that slow
+    queries against one database cannot use up the workers serving another.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = (
+            max_workers or multiprocessing.cpu_count()
+        )  # type: int
+        self._bind_max_workers: Dict[Optional[str], int] = {}
+        # sizes provided by `SQLAlchemy.configure`, for binds without a size
+        # set explicitly through `set_max_workers`
+        self._default_max_workers: Dict[Optional[str], _WorkerCount] = {}
+        self._autoscaling: Dict[Optional[str], _Autoscaling] = {}
+        self._max_queue_sizes: Dict[Optional[str], Optional[int]] = {}
+        self._pools: Dict[Optional[str], _WorkerPool] = {}
+
+    def set_max_workers(self, count: int, bind: Optional[str] = None):
+        """Resizes the pool used for a bind key (or the default pool), turning
+        off autoscaling for it. Work that's already running is not waited
+        upon, while queued work is picked up by the resized pool.
+        """
+        if bind is None:
+            self._max_workers = count
+
+        self._bind_max_workers[bind] = count
+
+        self._autoscaling.pop(bind, None)
+
+        pool = self._get_pool(bind)
+        pool.autoscaling = None
+        pool.resize(count)
+
+    def set_autoscaling(
+        self,
+        min_workers: int,
+        max_workers: int,
+        bind: Optional[str] = None,
+        target_queue_wait: float = 0.05,
+        interval: float = 1.0,
+    ):
+        """Lets the pool used for a bind key (or the default pool) grow and
+        shrink between `min_workers` and `max_workers`.
+
+        At most every `interval` seconds, the pool grows if work has been
+        waiting for a worker longer than `target_queue_wait` seconds, and
+        shrinks by one worker once nothing is waiting anymore.
+        """
+        autoscaling = (min_workers, max_workers, target_queue_wait, interval)
+        self._autoscaling[bind] = autoscaling
+
+        pool = self._get_pool(bind)
+        pool.autoscaling = autoscaling
+        pool.resize(max(min_workers, min(max_workers, pool.max_workers)))
+
+    def set_max_queue_size(
+        self, size: Optional[int], bind: Optional[str] = None
+    ):
+        """Limits how much work may wait for a worker in the pool used for a
+        bind key (or the default pool). None removes the limit.
+        """
+        self._max_queue_sizes[bind] = size
+
+        self._get_pool(bind).max_queue_size = size
+
+    def after_fork(self):
+        """Drops the thread pools, since their threads don't exist in a child
+        process. They're created again (with the same settings) when needed.
+        """
+        self._pools = {}
+
+    def configure_bind(
+        self, bind: Optional[str], max_workers: Optional[_WorkerCount]
+    ):
+        """Sets the size of the pool used for a bind key (or the default
+        pool), unless one was set with `set_max_workers`. `max_workers` may be
+        a callable, in which case it's only evaluated once the pool is needed,
+        falling back to the default size if it returns None. None removes the
+        size set for the bind.
+        """
+        if max_workers is None:
+            self._default_max_workers.pop(bind, None)
+        else:
+            self._default_max_workers[bind] = max_workers
+
+        if bind in self._bind_max_workers:
+            return
+
+        pool = self._pools.pop(bind, None)
+        if pool:
+            pool.shutdown()
+
+    def as_future(
+        self,
+        query: Callable,
+        bind: Optional[str] = None,
+        timeout: Optional[float] = None,
+        wait: bool = False,
+        calls: Optional[Set[_Call]] = None,
+        lane: Optional[_Lane] = None,
+        db: Optional['SQLAlchemy'] = None,
+        check_circuit_breaker: bool = True,
+    ) -> Future:
+        """Runs `query` on a worker thread, returning a Future for its result.
+
+        If the work has not started within `timeout` seconds, it's dropped
+        and the Future fails with `DeadlineExceededError`. When the queue of
+        the pool is full, `QueueFullError` is raised, unless `wait` is set, in
+        which case the work is queued as soon as there's room.
+
+        If `db` is given, the queue and run times of the work are recorded in
+        its stats, and while its circuit breaker for the bind is open,
+        `CircuitOpenError` is raised without queueing the work (unless
+        `check_circuit_breaker` is unset, e.g. to clean up sessions).
+
+        If `calls` is given, the work is added to it until it completes, so
+        that it can be cancelled using `_Call.cancel`. If `lane` is given, the
+        work runs on it (see `_Lane`).
+        """
+        stats = None
+
+        if db is not None:
+            stats = db.stats
+
+            breaker = db.get_circuit_breaker(bind)
+            if breaker is not None and check_circuit_breaker:
+                breaker.check()
+
+        pool = self._get_pool(bind)
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        call = _Call(query, deadline, stats, bind)
+
+        if not pool.is_full:
+            return self._submit(pool, call, calls, lane)
+
+        if not wait:
+            raise QueueFullError()
+
+        return gen.convert_yielded(
+            self._submit_when_ready(pool, call, calls, lane)
+        )
+
+    def as_future_many(
+        self,
+        queries: Sequence[_Query],
+        bind: Optional[str] = None,
+        parallel: bool = False,
+        **kwargs
+    ) -> Future:
+        """Runs several queries in a single trip to the pool of `bind`, one
+        after the other on the same worker, returning a Future for the list of
+        their results.
+
+        Queries may also be given as `(query, bind)` pairs. If `parallel` is
+        set, the queries for each bind key run on the pool of that bind, and
+        all the binds are queried at the same time. Since sessions are not
+        thread-safe, queries for different binds should use separate sessions
+        in that case.
+
+        Any other keyword arguments are passed on to `as_future`.
+        """
+        groups: Dict[Optional[str], List[Tuple[int, Callable]]] = {}
+
+        for index, query in enumerate(queries):
+            query_bind = bind
+
+            if isinstance(query, tuple):
+                query, query_bind = query
+
+            if not parallel:
+                query_bind = bind
+
+            groups.setdefault(query_bind, []).append((index, query))
+
+        futures = [
+            self.as_future(
+                functools.partial(_run_all, [query for _, query in group]),
+                bind=group_bind,
+                **kwargs
+            )
+            for group_bind, group in groups.items()
+        ]
+
+        return gen.convert_yielded(
+            self._gather(list(groups.values()), futures, len(queries))
+        )
+
+    async def as_stream(
+        self,
+        query: Union[Query, Callable],
+        chunk_size: int = 1000,
+        buffer_size: int = 2,
+        bind: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[list]:
+        """Runs a query on a worker thread, yielding its rows in lists of
+        `chunk_size` rows as they're fetched.
+
+        `query` is either a `Query`, which is fetched using a server-side
+        cursor where the driver supports it (see `Query.yield_per`), or a
+        callable returning the rows (e.g. a `Result`, for which server-side
+        cursors are enabled by the `yield_per` execution option).
+
+        At most `buffer_size` chunks are fetched ahead of the ones consumed,
+        after which the worker waits until the handler catches up. The session
+        running the query should not be used until the iteration is over.
+
+        Any other keyword arguments are passed on to `as_future`.
+        """
+        io_loop = IOLoop.current()
+        chunks = queues.Queue()  # type: queues.Queue
+        slots = threading.Semaphore(buffer_size)
+        closed = threading.Event()
+
+        def fetch():
+            rows = query() if callable(query) else query
+
+            if isinstance(rows, Query):
+                rows = rows.yield_per(chunk_size)
+
+            iterator = iter(rows)
+
+            try:
+                while True:
+                    slots.acquire()
+
+                    if closed.is_set():
+                        return
+
+                    chunk = list(itertools.islice(iterator, chunk_size))
+
+                    if not chunk:
+                        return
+
+                    io_loop.add_callback(chunks.put_nowait, chunk)
+            finally:
+                for source in (iterator, rows):
+                    close = getattr(source, 'close', None)
+
+                    if close is not None:
+                        close()
+
+        future = self.as_future(fetch, bind=bind, **kwargs)
+
+        # runs after the chunks fetched by the worker were queued
+        io_loop.add_future(future, lambda f: chunks.put_nowait(None))
+
+        try:
+            while True:
+                chunk = await chunks.get()
+
+                if chunk is None:
+                    # raises the error the worker ran into, if any
+                    future.result()
+                    return
+
+                slots.release()
+
+                yield chunk
+        finally:
+            # lets the worker go, if the iteration is abandoned early
+            closed.set()
+            slots.release()
+
+    async def _gather(
+        self,
+        groups: List[List[Tuple[int, Callable]]],
+        futures: List[Future],
+        count: int,
+    ) -> list:
+        results = [None] * count
+
+        for group, values in zip(groups, await gen.multi(futures)):
+            for (index, _), value in zip(group, values):
+                results[index] = value
+
+        return results
+
+    def _submit(
+        self,
+        pool: _WorkerPool,
+        call: _Call,
+        calls: Optional[Set[_Call]] = None,
+        lane: Optional[_Lane] = None,
+    ) -> Future:
+        # concurrent.futures.Future is not compatible with the "new style"
+        # asyncio Future, and awaiting on such "old-style" futures does not
+        # work.
+        #
+        # tornado includes a `run_in_executor` function to help with this
+        # problem, but it's only included in version 5+. Hence, we copy a
+        # little bit of code here to handle this incompatibility.
+
+        old_future = pool.submit(call, lane)
+        new_future = Future()  # type: Future
+        io_loop = call.io_loop = IOLoop.current()
+
+        if calls is not None:
+            calls.add(call)
+
+        def on_done(f):
+            if calls is not None:
+                calls.discard(call)
+
+            if f.cancelled():
+                future_set_exception_unless_cancelled(
+                    new_future, QueryCancelledError()
+                )
+            else:
+                chain_future(f, new_future)
+
+            pool.wake_waiter()
+
+        io_loop.add_future(old_future, on_done)
+
+        return new_future
+
+    async def _submit_when_ready(
+        self,
+        pool: _WorkerPool,
+        call: _Call,
+        calls: Optional[Set[_Call]] = None,
+        lane: Optional[_Lane] = None,
+    ):
+        await pool.wait_for_slot(call.deadline)
+
+        if call.cancelled:
+            raise QueryCancelledError()
+
+        return await self._submit(pool, call, calls, lane)
+
+    def _get_pool(self, bind: Optional[str] = None) -> _WorkerPool:
+        pool = self._pools.get(bind)
+
+        if pool is None:
+            pool = _WorkerPool(self._get_max_workers(bind))
+            pool.autoscaling = self._autoscaling.get(bind)
+            pool.max_queue_size = self._max_queue_sizes.get(bind)
+            pool.bind = bind
+            self._pools[bind] = pool
+
+        return pool
+
+    def _get_max_workers(self, bind: Optional[str] = None) -> int:
+        count: Optional[_WorkerCount] = self._bind_max_workers.get(bind)
+
+        if count is None:
+            count = self._default_max_workers.get(bind)
+
+        if callable(count):
+            count = count()
+
+        return count or self._max_workers
+
+
+def read_only(method: Callable) -> Callable:
+    """Decorator for request handler methods which only read from the
+    database. Sessions built by the handler while running such a method are
+    read-only (see `SessionMixin.read_only`).
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.read_only = True
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class _SessionContext:
+    """Context manager returned by `SessionMixin.make_session`.
+
+    With `async with`, the session is committed (or rolled back) and closed
+    on the `as_future` thread pool, so that the IOLoop isn't blocked waiting
+    for the database. Errors are raised from the `async with` block.
+    """
+
+    def __init__(self, handler: 'SessionMixin'):
+        self._handler = handler
+        self._session = None  # type: Optional[Session]
+
+    def __enter__(self) -> Session:
+        self._session = self._handler._make_session()
+        return self._session
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._handler._end_session(self._session, commit=exc_type is None)
+
+    async def __aenter__(self) -> Session:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await _async_exec.as_future(
+            functools.partial(
+                self._handler._end_session,
+                self._session,
+                commit=exc_type is None,
+            ),
+            wait=True,
+            lane=self._handler._get_lane(),
+            db=self._handler._find_db(),
+            check_circuit_breaker=False,
+        )
+
+
+class SessionMixin:
+    _session = None  # type: Optional[Session]
+    _calls = None  # type: Optional[Set[_Call]]
+    _lane = None  # type: Optional[_Lane]
+    application = None  # type: Optional[Application]
+
+    # Sessions of read-only handlers run their statements in autocommit
+    # mode, so that the driver doesn't need to wrap them in a transaction.
+    read_only = False
+
+    # When replicas are configured, SELECTs are sent to the primary either
+    # always (`use_primary`), or once the session wrote something
+    # (`primary_after_write`), even after that has been committed.
+    use_primary = False
+    primary_after_write = False
+
+    # Commit and close `self.session` on the `as_future` thread pool once the
+    # request finishes, instead of on the IOLoop. Errors are logged.
+    finish_on_executor = False
+
+    # Run the `as_future` work of the request one piece at a time, in order
+    # (across binds), on the workers of the pools it shares with other
+    # requests. This doesn't pin the work to a single thread.
+    serialize_work = False
+
+    def as_future(self, query: Callable, **kwargs) -> Future:
+        """Same as the module-level `as_future`, except that the work is
+        cancelled if the client closes the connection before it completes.
+        """
+        if self._calls is None:
+            self._calls = set()
+        self._set_current_handler()
+
+        kwargs.setdefault('db', self._find_db())
+
+        return _async_exec.as_future(
+            query, calls=self._calls, lane=self._get_lane(), **kwargs
+        )
+
+    def as_future_many(self, queries: Sequence[_Query], **kwargs) -> Future:
+        """Same as the module-level `as_future_many`, except that the work is
+        cancelled if the client closes the connection before it completes.
+        """
+        if self._calls is None:
+            self._calls = set()
+        self._set_current_handler()
+
+        kwargs.setdefault('db', self._find_db())
+
+        return _async_exec.as_future_many(
+            queries, calls=self._calls, lane=self._get_lane(), **kwargs
+        )
+
+    def as_stream(
+        self, query: Union[Query, Callable], **kwargs
+    ) -> AsyncIterator[list]:
+        """Same as the module-level `as_stream`, except that the work is
+        cancelled if the client closes the connection before it completes.
+        """
+        if self._calls is None:
+            self._calls = set()
+        self._set_current_handler()
+
+        kwargs.setdefault('db', self._find_db())
+
+        return _async_exec.as_stream(
+            query, calls=self._calls, lane=self._get_lane(), **kwargs
+        )
+
+    def make_session(self) -> _SessionContext:
+        """Returns a context manager for a new session, which is committed
+        if the block completes and wrote something, or rolled back if the
+        block raises. Use `async with` to do so on the `as_future` thread
+        pool.
+        """
+        return _SessionContext(self)
+
+    def on_finish(self):
+        next_on_finish = None
+
+        try:
+            next_on_finish = super(SessionMixin, self).on_finish
+        except AttributeError:
+            pass
+
+        try:
+            if self._session:
+                session, self._session = self._session, None
+
+                if self.finish_on_executor:
+                    self._end_session_on_executor(session)
+                else:
+                    self._end_session(session)
+        finally:
+            if _current_handler.get() is self:
+                _current_handler.set(None)
+
+            if next_on_finish:
+                next_on_finish()
+
+    def on_connection_close(self):
+        next_on_connection_close = None
+
+        try:
+            next_on_connection_close = super(
+                SessionMixin, self
+            ).on_connection_close
+        except AttributeError:
+            pass
+
+        # work that's still queued is dropped, while statements that are
+        # already running are interrupted (where the driver supports it) so
+        # that the workers and connections are freed up
+        for call in list(self._calls or ()):
+            call.cancel()
+
+        if next_on_connection_close:
+            next_on_connection_close()
+
+    @property
+    def session(self) -> Session:
+        if not self._session:
+            self._session = self._make_session()
+        return self._session
+
+    def _make_session(self) -> Session:
+        self._set_current_handler()
+
+        return self._get_db().acquire_session(
+            read_only=self.read_only,
+            use_primary=self.use_primary,
+            primary_after_write=self.primary_after_write,
+        )
+
+    def _release_session(self, session: Session):
+        self._get_db().release_session(session)
+
+    def _end_session(self, session: Session, commit: bool = True):
+        # sessions which only ran SELECTs have nothing to commit, and closing
+        # them is enough to release the connection
+        try:
+            if not commit:
+                session.rollback()
+            elif session.has_writes:
+                session.commit()
+        finally:
+            self._release_session(session)
+
+    def _end_session_on_executor(self, session: Session):
+        # work the handler submitted which is still queued or running may
+        # use the session as well, so the commit waits for it
+        pending = [
+            call.future
+            for call in self._calls or ()
+            if call.future is not None
+        ]
+
+        def end_session():
+            concurrent.futures.wait(pending)
+            self._end_session(session)
+
+        IOLoop.current().add_future(
+            _async_exec.as_future(
+                end_session,
+                wait=True,
+                lane=self._get_lane(),
+                db=self._find_db(),
+                check_circuit_breaker=False,
+            ),
+            self._on_session_ended,
+        )
+
+    def _on_session_ended(self, future: Future):
+        error = future.exception()
+
+        if error is not None:
+            app_log.error(
+                'Could not commit the session of %r',
+                self,
+                exc_info=(type(error), error, error.__traceback__),
+            )
+
+    def _get_lane(self) -> Optional[_Lane]:
+        if self.serialize_work and self._lane is None:
+            self._lane = _Lane()
+        return self._lane
+
+    def _set_current_handler(self):
+        # tornado serves each request in a task of its own, so this only
+        # applies to the statements run for this request (see SlowQueryLog)
+        if _current_handler.get() is not self:
+            _current_handler.set(self)
+
+    def _find_db(self) -> Optional['SQLAlchemy']:
+        # `as_future` also works without a database configured, only without
+        # recording stats or checking circuit breakers then
+        if not self.application:
+            return None
+        return self.application.settings.get('db')
+
+    def _get_db(self) -> 'SQLAlchemy':
+        if not self.application:
+            raise MissingFactoryError()
+
+        db = self.application.settings.get('db')
+        if not db:
+            raise MissingDatabaseSettingError()
+        return db
+
+
+class AsyncSessionMixin:
+    """Counterpart of `SessionMixin` for databases configured with an asyncio
+    driver (e.g. `sqlite+aiosqlite` or `postgresql+asyncpg`).
+
+    Sessions returned by this mixin are `AsyncSession` objects, which can be
+    awaited on directly from the IOLoop without going through `as_future`.
+    """
+
+    _session = None  # type: Optional[AsyncSession]
+    application = None  # type: Optional[Application]
+
+    read_only = False
+    use_primary = False
+    primary_after_write = False
+
+    @asynccontextmanager
+    async def make_session(self) -> AsyncIterator[AsyncSession]:
+        session = None
+
+        try:
+            session = self._make_session()
+
+            yield session
+        except Exception:
+            if session:
+                await session.rollback()
+            raise
+        else:
+            if session.sync_session.has_writes:
+                await session.commit()
+        finally:
+            if session:
+                await session.close()
+
+    def on_finish(self):
+        next_on_finish = None
+
+        try:
+            next_on_finish = super(AsyncSessionMixin, self).on_finish
+        except AttributeError:
+            pass
+
+        if self._session:
+            session, self._session = self._session, None
+
+            IOLoop.current().spawn_callback(self._finish_session, session)
+
+        if _current_handler.get() is self:
+            _current_handler.set(None)
+
+        if next_on_finish:
+            next_on_finish()
+
+    @property
+    def session(self) -> AsyncSession:
+        if not self._session:
+            self._session = self._make_session()
+        return self._session
+
+    async def _finish_session(self, session: AsyncSession):
+        try:
+            if session.sync_session.has_writes:
+                await session.commit()
+        finally:
+            await session.close()
+
+    def _make_session(self) -> AsyncSession:
+        if not self.application:
+            raise MissingFactoryError()
+
+        if _current_handler.get() is not self:
+            _current_handler.set(self)
+
+        db = self.application.settings.get('db')
+        if not db:
+            raise MissingDatabaseSettingError()
+        return db.async_sessionmaker(
+            read_only=self.read_only,
+            use_primary=self.use_primary,
+            primary_after_write=self.primary_after_write,
+        )
+
+
+_async_exec = _AsyncExecution()
+
+as_future = _async_exec.as_future
+
+as_future_many = _async_exec.as_future_many
+
+as_stream = _async_exec.as_stream
+
+set_max_workers = _async_exec.set_max_workers
+
+set_autoscaling = _async_exec.set_autoscaling
+
+set_max_queue_size = _async_exec.set_max_queue_size
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_async_exec.after_fork)
+
+
+def _table_keys(tables) -> Set[_TableKey]:
+    return {
+        (table.info.get('bind_key'), table.fullname)
+        for table in tables
+        if isinstance(table, Table)
+    }
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+
+    return value
+
+
+def _query_cache_key(orm_execute_state):
+    """Returns the key to cache the result of a statement under, or None if
+    the statement (or its parameters) cannot be cached.
+    """
+    cache_key = orm_execute_state.statement._generate_cache_key()
+
+    if cache_key is None:
+        return None
+
+    key = (
+        cache_key.key,
+        _hashable([bind.effective_value for bind in cache_key.bindparams]),
+        _hashable(orm_execute_state.parameters),
+    )
+
+    try:
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+def _detach_frozen_result(statement, frozen_result):
+    # results cached for the whole process are shared across sessions, so
+    # they hold detached copies of the objects loaded by the query
+    session = Session()
+
+    try:
+        return merge_frozen_result(
+            session, statement, frozen_result, load=False
+        )
+    finally:
+        session.close()
+
+
+def _default_shard_resolver(binds: Sequence[str]) -> Callable:
+    def resolve(value):
+        return binds[zlib.crc32(str(value).encode('utf-8')) % len(binds)]
+
+    return resolve
+
+
+def _shard_key_values(clause, column, parameters) -> Optional[list]:
+    """Returns the values a WHERE clause restricts the shard key column to,
+    or None if it doesn't.
+    """
+    while isinstance(clause, Grouping):
+        clause = clause.element
+
+    if isinstance(clause, BooleanClauseList):
+        if clause.operator is not operators.and_:
+            return None
+
+        for element in clause.clauses:
+            values = _shard_key_values(element, column, parameters)
+
+            if values is not None:
+                return values
+
+        return None
+
+    if not isinstance(clause, BinaryExpression) or clause.operator not in (
+        operators.eq,
+        operators.in_op,
+    ):
+        return None
+
+    left, right = clause.left, clause.right
+
+    if isinstance(left, BindParameter):
+        left, right = right, left
+
+    if not (
+        isinstance(left, ColumnElement)
+        and isinstance(right, BindParameter)
+        and left.shares_lineage(column)
+    ):
+        return None
+
+    value = right.effective_value
+    if isinstance(parameters, dict):
+        value = parameters.get(right.key, value)
+
+    return [value] if clause.operator is operators.eq else list(value)
+
+
+def _execute_on_shard(
+    db, shard, statement, parameters, execution_options, **options
+):
+    # the cache lookup (if any) already happened for the whole statement
+    execution_options = dict(
+        execution_options, identity_token=shard, cache=None
+    )
+
+    with db.sessionmaker(**options) as session:
+        return session.execute(
+            statement,
+            parameters,
+            execution_options=execution_options,
+            bind_arguments={'shard': shard},
+        ).freeze()
+
+
+class _ShardTask:
+    """The query of a fan-out for one shard, run either by a worker of the
+    pool of the shard, or by the thread fanning out, whichever gets to it
+    first.
+    """
+
+    def __init__(self, shard: str, fn: Callable):
+        self.shard = shard
+        self.fn = fn
+        self.result: concurrent.futures.Future = concurrent.futures.Future()
+
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            if self.result.running() or self.result.done():
+                return
+            self.result.set_running_or_notify_cancel()
+
+        try:
+            self.result.set_result(self.fn())
+        except BaseException as error:
+            self.result.set_exception(error)
+
+
+class SessionEx(Session):
+    """The SessionEx extends the default session system with bind selection.
+
+    It also keeps track of whether anything was written using the session, so
+    that sessions which only ran SELECTs don't need to be committed, and which
+    tables were written to, to invalidate the results cached for them.
+    """
+
+    def __init__(
+        self,
+        db,
+        autocommit=False,
+        autoflush=True,
+        read_only=False,
+        use_primary=False,
+        primary_after_write=False,
+        **options
+    ):
+        self.db = db
+        self.read_only = read_only
+        self.use_primary = use_primary
+        self.primary_after_write = primary_after_write
+        self._has_writes = False
+        self._query_cache: Optional[QueryCache] = None
+        self._written_tables: Set[_TableKey] = set()
+        self._replicas: Dict[Optional[str], Engine] = {}
+
+        # Tables are routed to their engine by `get_bind`, using the bind key
+        # recorded by `BindMeta`. This saves copying the table->engine mapping
+        # into every new session, as passing `binds` would do.
+        bind = options.pop('bind', None) or db.engine
+
+        super().__init__(
+            autocommit=autocommit, autoflush=autoflush, bind=bind, **options
+        )
+
+        # lets flushes send each row of a sharded table to its shard. Only
+        # done if there are any, as SQLAlchemy refuses bulk operations with a
+        # connection_callable.
+        if db.metadata.info.get(_SHARDED_KEY):
+            self.connection_callable = self._connection_for_instance
+
+    def _reset_for_reuse(self):
+        # Closes the session and clears everything it kept track of, so that
+        # it can be reused (see `SQLAlchemy.acquire_session`). Session.reset
+        # only exists as of SQLAlchemy 2.0.22.
+        reset = getattr(super(), 'reset', None)
+
+        if reset is not None:
+            reset()
+        else:
+            self.close()
+
+        self.read_only = False
+        self.use_primary = False
+        self.primary_after_write = False
+        self._has_writes = False
+        self._query_cache = None
+        self._written_tables = set()
+        self._replicas = {}
+
+    @property
+    def has_writes(self) -> bool:
+        """Whether the current transaction may contain changes which need to
+        be committed.
+        """
+        return bool(self._has_writes or self.new or self.dirty or self.deleted)
+
+    @property
+    def query_cache(self) -> QueryCache:
+        """The cache for the results of queries run with the
+        `cache='request'` execution option, which lives as long as the
+        session.
+        """
+        if self._query_cache is None:
+            self._query_cache = QueryCache(self.db.query_cache_size)
+        return self._query_cache
+
+    def connection(self, *args, **kwargs):
+        # statements executed directly on the connection can't be inspected,
+        # so we have to assume they write something
+        self._mark_written()
+
+        return super().connection(*args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, shard=None, **kwargs):
+        """Return the engine or connection for a given model or
+        table, using the `__bind_key__` if it is set, or the `shard` the
+        statement was routed to for sharded models.
+
+        SELECTs outside of a write transaction are sent to one of the replicas
+        of the bind, if it has any.
+        """
+        if shard is not None:
+            bind = self.db.get_engine(shard)
+        else:
+            bind = self._get_bind(mapper=mapper, clause=clause, **kwargs)
+
+        bind_key = self.db.get_bind_key(bind)
+
+        if bind_key is not False:
+            breaker = self.db.get_circuit_breaker(bind_key)
+            if breaker is not None:
+                breaker.check()
+
+            if self._use_replica(clause):
+                bind = self._get_replica(bind_key)
+
+        # AsyncSession drives a regular Session under the hood, which needs
+        # the synchronous side of an AsyncEngine.
+        bind = getattr(bind, 'sync_engine', bind)
+
+        if self.read_only and isinstance(bind, Engine):
+            return self.db.get_autocommit_engine(bind)
+
+        return bind
+
+    def _mark_written(self):
+        self._has_writes = True
+
+        if self.primary_after_write:
+            self.use_primary = True
+
+    def _connection_for_instance(self, mapper=None, instance=None, **kwargs):
+        info = getattr(mapper.persist_selectable, 'info', {})
+        shard = None
+
+        if 'shard_key' in info and instance is not None:
+            state = inspect(instance)
+            shard = state.key[2] if state.key else state.identity_token
+
+            if shard is None:
+                column = mapper.persist_selectable.c[info['shard_key']]
+                value = getattr(
+                    instance, mapper.get_property_by_column(column).key
+                )
+
+                if value is None:
+                    raise ShardKeyError(
+                        'no value for the shard key of {}.'.format(instance)
+                    )
+
+                # keeps rows with the same primary key on different shards
+                # apart in the identity map
+                shard = state.identity_token = info['shard_resolver'](value)
+
+        return self.get_transaction().connection(mapper, shard=shard)
+
+    def _execute_sharded(self, orm_execute_state):
+        statement = orm_execute_state.statement
+
+        tables = [
+            table
+            for table in find_tables(
+                statement, check_columns=True, include_crud=True
+            )
+            if 'shard_key' in getattr(table, 'info', {})
+        ]
+        if not tables:
+            return None
+
+        shards = self._choose_shards(orm_execute_state, tables[0])
+
+        if len(shards) == 1:
+            orm_execute_state.bind_arguments['shard'] = shards[0]
+            orm_execute_state.update_execution_options(
+                identity_token=shards[0]
+            )
+            return None
+
+        if orm_execute_state.is_select and not self.has_writes:
+            return self._execute_on_shards(orm_execute_state, shards)
+
+        # pending writes are only visible from this session's transaction,
+        # so the shards are queried through it, one after the other
+        results = []
+        for shard in shards:
+            orm_execute_state.update_execution_options(identity_token=shard)
+            results.append(
+                orm_execute_state.invoke_statement(
+                    bind_arguments=dict(
+                        orm_execute_state.bind_arguments, shard=shard
+                    )
+                )
+            )
+
+        return results[0].merge(*results[1:])
+
+    def _choose_shards(self, orm_execute_state, table) -> List[str]:
+        info = table.info
+
+        if orm_execute_state.is_select:
+            # refreshing an object, or loading one of its relationships
+            token = orm_execute_state.load_options._identity_token
+
+            state = orm_execute_state.lazy_loaded_from
+            if token is None and state is not None:
+                token = state.key[2] if state.key else state.identity_token
+
+            if token is not None:
+                return [token]
+
+        column = table.c[info['shard_key']]
+        parameters = orm_execute_state.parameters
+
+        if orm_execute_state.is_insert:
+            values = None
+            if isinstance(parameters, dict) and column.key in parameters:
+                values = [parameters[column.key]]
+        else:
+            values = _shard_key_values(
+                getattr(orm_execute_state.statement, 'whereclause', None),
+                column,
+                parameters,
+            )
+
+        if values is None:
+            if orm_execute_state.is_insert:
+                raise ShardKeyError(
+                    'no value for the shard key of {}.'.format(table.name)
+                )
+            return list(info['shard_binds'])
+
+        shards = []
+        for value in values:
+            shard = info['shard_resolver'](value)
+
+            if shard not in shards:
+                shards.append(shard)
+
+        return shards
+
+    def _execute_on_shards(self, orm_execute_state, shards: List[str]):
+        """Runs a SELECT on several shards at once, each on the `as_future`
+        pool of the shard, using separate sessions, and merges the results
+        into this session.
+
+        The shard of the pool this runs on (if any) is queried inline, since
+        all the workers of that pool may be fanning out as well. Shards which
+        no worker picked up yet once that's done are queried inline too,
+        rather than waiting for a worker.
+        """
+        statement = orm_execute_state.statement
+
+        tasks = [
+            _ShardTask(
+                shard,
+                functools.partial(
+                    _execute_on_shard,
+                    self.db,
+                    shard,
+                    statement,
+                    orm_execute_state.parameters,
+                    orm_execute_state.local_execution_options,
+                    read_only=self.read_only,
+                    use_primary=self.use_primary,
+                ),
+            )
+            for shard in shards
+        ]
+
+        call = getattr(_worker_state, 'call', None)
+        bind = call.bind if call is not None else None
+        inline = [task for task in tasks if task.shard == bind]
+        others = [task for task in tasks if task.shard != bind]
+
+        # `as_future` needs the IOLoop, which a worker can't wait on
+        if call is not None and call.io_loop is not None:
+            call.io_loop.add_callback(self._submit_shard_tasks, others)
+        elif IOLoop.current(instance=False) is not None:
+            self._submit_shard_tasks(others)
+
+        for task in inline + others:
+            task.run()
+
+        concurrent.futures.wait([task.result for task in tasks])
+
+        results = []
+        for task in tasks:
+            frozen_result = task.result.result()
+
+            if orm_execute_state.is_orm_statement:
+                frozen_result = merge_frozen_result(
+                    self, statement, frozen_result, load=False
+                )
+
+            results.append(frozen_result())
+
+        return results[0].merge(*results[1:])
+
+    def _submit_shard_tasks(self, tasks: List[_ShardTask]):
+        handler = _current_handler.get()
+        calls = getattr(handler, '_calls', None)
+
+        for task in tasks:
+            try:
+                future = _async_exec.as_future(
+                    task.run, bind=task.shard, calls=calls, db=self.db
+                )
+            except (QueueFullError, CircuitOpenError):
+                # left to the thread fanning out
+                continue
+
+            # work dropped before it started (e.g. once the client went away)
+            # is left to the thread fanning out as well
+            future.add_done_callback(lambda future: future.exception())
+
+    def _invalidate(self, tables: Set[_TableKey], end: bool = False):
+        # Writes are only visible to other sessions once committed, while
+        # other sessions may cache what they read in the meantime. Results
+        # cached for the whole process are thus invalidated again at the end
+        # of the transaction.
+        if end:
+            tables = tables | self._written_tables
+            self._written_tables = set()
+        else:
+            self._written_tables |= tables
+
+        if not tables:
+            return
+
+        if self._query_cache is not None:
+            self._query_cache.invalidate(tables)
+
+        self.db.query_cache.invalidate(tables)
+
+    def _execute_cached(self, orm_execute_state, scope: str):
+        if scope not in _CACHE_SCOPES:
+            raise ValueError('unknown cache scope {}.'.format(scope))
+
+        if (
+            orm_execute_state.is_relationship_load
+            or orm_execute_state.is_column_load
+        ):
+            return None
+
+        key = _query_cache_key(orm_execute_state)
+        if key is None:
+            return None
+
+        # the ORM flushes pending changes before running a query, which needs
+        # to happen before looking up the cache as well
+        self._autoflush()
+
+        statement = orm_execute_state.statement
+        tables = _table_keys(find_tables(statement, check_columns=True))
+
+        # results read by a transaction with uncommitted writes can't be
+        # shared with other sessions, so they're only cached for this one
+        if scope == 'process' and (
+            self.has_writes or tables & self._written_tables
+        ):
+            scope = 'request'
+
+        cache = self.query_cache if scope == 'request' else self.db.query_cache
+        frozen_result = cache.get(key)
+
+        if frozen_result is not None:
+            if orm_execute_state.is_orm_statement:
+                frozen_result = merge_frozen_result(
+                    self, statement, frozen_result, load=False
+                )
+            return frozen_result()
+
+        versions = cache.versions(tables)
+
+        frozen_result = orm_execute_state.invoke_statement().freeze()
+
+        cache.set(
+            key,
+            (
+                _detach_frozen_result(statement, frozen_result)
+                if scope == 'process' and orm_execute_state.is_orm_statement
+                else frozen_result
+            ),
+            tables,
+            versions,
+        )
+
+        return frozen_result()
+
+    def _get_replica(self, bind_key: Optional[str]):
+        # the replica is picked once per transaction, so that its reads come
+        # from the same snapshot, using a single connection
+        engine = self._replicas.get(bind_key)
+
+        if engine is None:
+            engine = self._replicas[bind_key] = self.db.get_read_engine(
+                bind_key
+            )
+
+        return engine
+
+    def _use_replica(self, clause=None) -> bool:
+        return (
+            getattr(clause, 'is_select', False)
+            and getattr(clause, '_for_update_arg', None) is None
+            and not self.use_primary
+            and not self._has_writes
+            and not self._flushing
+        )
+
+    def _get_bind(self, mapper=None, clause=None, **kwargs):
+        if mapper is not None:
+            try:
+                # SA >= 1.3
+                persist_selectable = mapper.persist_selectable
+            except AttributeError:
+                # SA < 1.3
+                persist_selectable = mapper.mapped_table
+
+            info = getattr(persist_selectable, 'info', {})
+            bind_key = info.get('bind_key')
+
+            if bind_key is not None:
+                return self.db.get_engine(bind=bind_key)
+
+            if 'shard_key' in info:
+                raise ShardKeyError(
+                    'no shard given for {}.'.format(persist_selectable.name)
+                )
+        elif clause is not None and self.db.binds:
+            for table in find_tables(
+                clause, include_aliases=True, include_crud=True
+            ):
+                bind_key = getattr(table, 'info', {}).get('bind_key')
+
+                if bind_key is not None:
+                    return self.db.get_engine(bind=bind_key)
+
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(SessionEx, 'do_orm_execute')
+def _on_orm_execute(orm_execute_state):
+    session = orm_execute_state.session
+
+    if not orm_execute_state.is_select:
+        session._mark_written()
+        session._invalidate(
+            _table_keys(
+                find_tables(orm_execute_state.statement, include_crud=True)
+            )
+        )
+        return None
+
+    scope = orm_execute_state.execution_options.get('cache')
+
+    if scope is not None:
+        return session._execute_cached(orm_execute_state, scope)
+
+    return None
+
+
+@event.listens_for(SessionEx, 'do_orm_execute')
+def _on_orm_execute_sharded(orm_execute_state):
+    # runs after the cache lookup, so that results merged from several shards
+    # are cached as a whole
+    if orm_execute_state.bind_arguments.get('shard') is not None:
+        return None
+
+    return orm_execute_state.session._execute_sharded(orm_execute_state)
+
+
+@event.listens_for(SessionEx, 'after_flush')
+def _on_flush(session, flush_context):
+    session._mark_written()
+    session._invalidate(
+        _table_keys(
+            table
+            for instance in itertools.chain(
+                session.new, session.dirty, session.deleted
+            )
+            for table in inspect(instance).mapper.tables
+        )
+    )
+
+
+@event.listens_for(SessionEx, 'after_transaction_end')
+def _on_transaction_end(session, transaction):
+    # committing or rolling back a SAVEPOINT leaves the changes made in the
+    # enclosing transaction pending
+    if transaction.parent is None:
+        session._has_writes = False
+        session._replicas = {}
+        session._invalidate(set(), end=True)
+
+
+class AsyncSessionEx(AsyncSession):
+    """The AsyncSessionEx is the asyncio flavor of `SessionEx`, used for
+    databases configured with an asyncio driver.
+    """
+
+    sync_session_class = SessionEx
+
+    def __init__(self, db, **options):
+        self.db = db
+        bind = options.pop('bind', None) or db.engine
+
+        super().__init__(bind=bind, db=db, **options)
+
+
+@event.listens_for(Table, 'after_parent_attach')
+def _on_table_attach(table, metadata):
+    # lets `SQLAlchemy.get_binds` know that its cached mapping is stale
+    metadata.info[_TABLES_VERSION_KEY] = (
+        metadata.info.get(_TABLES_VERSION_KEY, 0) + 1
+    )
+
+
+def _instrument_pool(
+    pool,
+    stats: Stats,
+    bind: Optional[str],
+    circuit_breaker: Optional[CircuitBreaker] = None,
+):
+    connect = pool.connect
+
+    @functools.wraps(connect)
+    def timed_connect():
+        if circuit_breaker is not None:
+            circuit_breaker.probe()
+
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            stats.record(bind, 'checkout', time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+
+def _explain(engine, statement, parameters) -> Optional[list]:
+    """Runs `EXPLAIN` for a statement on a connection of its own, since the
+    connection of the statement may still be fetching its results, and an
+    error would abort its transaction. Returns None if the pool has no
+    connection to spare, rather than waiting for one.
+    """
+    prefix = (
+        'EXPLAIN QUERY PLAN '
+        if engine.dialect.name == 'sqlite'
+        else 'EXPLAIN '
+    )
+    pool = engine.pool
+
+    if (
+        isinstance(pool, QueuePool)
+        and pool._max_overflow >= 0
+        and pool.checkedout() >= pool.size() + pool._max_overflow
+    ):
+        return None
+
+    try:
+        with engine.connect() as connection:
+            # bypasses the events, so that it's not logged as well
+            cursor = connection.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                return [tuple(row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except Exception:
+        app_log.warning('Could not explain %r', statement, exc_info=True)
+        return None
+
+
+def _instrument_engine(
+    engine,
+    stats: Stats,
+    bind: Optional[str],
+    slow_query_log: Optional[SlowQueryLog] = None,
+    circuit_breaker: Optional[CircuitBreaker] = None,
+):
+    """Records the checkout and statement timings of an engine in `stats`,
+    its slow statements in `slow_query_log`, and its errors in
+    `circuit_breaker`.
+    """
+    engine = getattr(engine, 'sync_engine', engine)
+
+    _instrument_pool(engine.pool, stats, bind, circuit_breaker)
+
+    @event.listens_for(engine, 'engine_disposed')
+    def on_disposed(engine):
+        # disposing of an engine replaces its pool
+        _instrument_pool(engine.pool, stats, bind, circuit_breaker)
+
+    if circuit_breaker is not None:
+
+        @event.listens_for(engine, 'handle_error')
+        def handle_error(context):
+            if context.is_disconnect or isinstance(
+                context.sqlalchemy_exception,
+                (exc.OperationalError, exc.InterfaceError),
+            ):
+                circuit_breaker.record_failure()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        context._tornado_sqlalchemy_started = time.perf_counter()
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import DeclarativeMeta
-from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.orm.session import Session
-from tornado.concurrent import Future, chain_future
-from tornado.ioloop import IOLoop
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        seconds = time.perf_counter() - context._tornado_sqlalchemy_started
 
+        stats.record(bind, 'statement', seconds)
 
-__all__ = ('as_future', 'SessionMixin', 'set_max_workers', 'SQLAlchemy')
+        if circuit_breaker is not None:
+            circuit_breaker.record_success()
 
+        if slow_query_log is None or seconds < slow_query_log.threshold:
+            return
 
-class MissingFactoryError(Exception):
-    pass
+        explain = None
+        if not executemany and slow_query_log.should_explain(
+            statement, seconds
+        ):
+            explain = _explain(conn.engine, statement, parameters)
 
+        slow_query_log.record(statement, parameters, bind, seconds, explain)
 
-class MissingDatabaseSettingError(Exception):
-    pass
 
+def _write_chunk(engine, statement, chunk):
+    with engine.begin() as connection:
+        connection.execute(statement, chunk)
 
-class _AsyncExecution:
-    """Tiny wrapper around ThreadPoolExecutor. This class is not meant to be
-    instantiated externally, but internally we just use it as a wrapper around
-    ThreadPoolExecutor so we can control the pool size and make the
-    `as_future` function public.
-    """
 
-    def __init__(self, max_workers: Optional[int] = None):
-        self._max_workers = (
-            max_workers or multiprocessing.cpu_count()
-        )  # type: int
-        self._pool = None  # type: Optional[Executor]
+def _fetch_rows(engine, statement) -> list:
+    with engine.connect() as connection:
+        return connection.execute(statement).all()
 
-    def set_max_workers(self, count: int):
-        if self._pool:
-            self._pool.shutdown(wait=True)
 
-        self._max_workers = count
-        self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
+async def _write_chunk_async(engine, statement, chunk):
+    async with engine.begin() as connection:
+        await connection.execute(statement, chunk)
 
-    def as_future(self, query: Callable) -> Future:
-        # concurrent.futures.Future is not compatible with the "new style"
-        # asyncio Future, and awaiting on such "old-style" futures does not
-        # work.
-        #
-        # tornado includes a `run_in_executor` function to help with this
-        # problem, but it's only included in version 5+. Hence, we copy a
-        # little bit of code here to handle this incompatibility.
 
-        if not self._pool:
-            self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
+async def _fetch_rows_async(engine, statement) -> list:
+    async with engine.connect() as connection:
+        return (await connection.execute(statement)).all()
 
-        old_future = self._pool.submit(query)
-        new_future = Future()  # type: Future
 
-        IOLoop.current().add_future(
-            old_future, lambda f: chain_future(f, new_future)
-        )
+def _rows_by_bind(table, rows: List[dict]) -> Dict[Optional[str], list]:
+    info = table.info
 
-        return new_future
+    if 'shard_key' not in info:
+        return {info.get('bind_key'): rows}
 
+    groups: Dict[Optional[str], list] = {}
 
-class SessionMixin:
-    _session = None  # type: Optional[Session]
-    application = None  # type: Optional[Application]
+    for row in rows:
+        value = row.get(info['shard_key'])
 
-    @contextmanager
-    def make_session(self) -> Iterator[Session]:
-        session = None
+        if value is None:
+            raise ShardKeyError(
+                'no value for the shard key of {}.'.format(table.name)
+            )
 
-        try:
-            session = self._make_session()
+        groups.setdefault(info['shard_resolver'](value), []).append(row)
 
-            yield session
-        except Exception:
-            if session:
-                session.rollback()
-            raise
-        else:
-            session.commit()
-        finally:
-            if session:
-                session.close()
+    return groups
 
-    def on_finish(self):
-        next_on_finish = None
 
-        try:
-            next_on_finish = super(SessionMixin, self).on_finish
-        except AttributeError:
-            pass
+def _upsert_statement(table, dialect_name, index_elements, update_columns):
+    if dialect_name in ('postgresql', 'sqlite'):
+        insert = {'postgresql': postgresql, 'sqlite': sqlite}[
+            dialect_name
+        ].insert
+        statement = insert(table)
 
-        if self._session:
-            self._session.commit()
-            self._session.close()
+        if not update_columns:
+            return statement.on_conflict_do_nothing(
+                index_elements=index_elements
+            )
 
-        if next_on_finish:
-            next_on_finish()
+        return statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={name: statement.excluded[name] for name in update_columns},
+        )
 
-    @property
-    def session(self) -> Session:
-        if not self._session:
-            self._session = self._make_session()
-        return self._session
+    if dialect_name in ('mysql', 'mariadb'):
+        statement = mysql.insert(table)
 
-    def _make_session(self) -> Session:
-        if not self.application:
-            raise MissingFactoryError()
+        # MySQL needs at least one column to update, even if it's a no-op
+        return statement.on_duplicate_key_update(
+            {
+                name: statement.inserted[name]
+                for name in update_columns or index_elements
+            }
+        )
 
-        db = self.application.settings.get('db')
-        if not db:
-            raise MissingDatabaseSettingError()
-        return db.sessionmaker()
+    raise ValueError('upserts are not supported for {}.'.format(dialect_name))
 
 
-_async_exec = _AsyncExecution()
+def _ping(connection):
+    connection.dialect.do_ping(connection.connection.dbapi_connection)
 
-as_future = _async_exec.as_future
 
-set_max_workers = _async_exec.set_max_workers
+def _open_connection(engine, validate: bool):
+    connection = engine.connect()
 
+    try:
+        if validate:
+            _ping(connection)
+    except Exception:
+        connection.close()
+        raise
 
-class SessionEx(Session):
-    """The SessionEx extends the default session system with bind selection."""
+    return connection
 
-    def __init__(self, db, autocommit=False, autoflush=True, **options):
-        self.db = db
-        bind = options.pop('bind', None) or db.engine
-        binds = options.pop('binds', db.get_binds())
 
-        super().__init__(
-            autocommit=autocommit,
-            autoflush=autoflush,
-            bind=bind,
-            binds=binds,
-            **options
-        )
+async def _open_async_connection(engine, validate: bool):
+    connection = await engine.connect()
 
-    def get_bind(self, mapper=None, clause=None):
-        """Return the engine or connection for a given model or
-        table, using the `__bind_key__` if it is set.
-        """
+    try:
+        if validate:
+            await connection.run_sync(_ping)
+    except Exception:
+        await connection.close()
+        raise
 
-        if mapper is not None:
-            try:
-                # SA >= 1.3
-                persist_selectable = mapper.persist_selectable
-            except AttributeError:
-                # SA < 1.3
-                persist_selectable = mapper.mapped_table
+    return connection
 
-            info = getattr(persist_selectable, 'info', {})
-            bind_key = info.get('bind_key')
 
-            if bind_key is not None:
-                return self.db.get_engine(bind=bind_key)
+def _after_fork(ref: 'weakref.ReferenceType[SQLAlchemy]'):
+    db = ref()
+
+    if db is not None:
+        db.after_fork()
 
-        return super().get_bind(mapper=mapper, clause=clause)
+
+def _checked_out_connections(engine) -> int:
+    pool = getattr(engine, 'sync_engine', engine).pool
+
+    if isinstance(pool, QueuePool):
+        return pool.checkedout()
+
+    return 0
 
 
 class BindMeta(DeclarativeMeta):
@@ -168,40 +2469,201 @@ class BindMeta(DeclarativeMeta):
         bind_key = d.pop('__bind_key__', None) or getattr(
             cls, '__bind_key__', None
         )
+        shard_key = d.pop('__shard_key__', None) or getattr(
+            cls, '__shard_key__', None
+        )
+        shard_binds = d.pop('__shard_binds__', None) or getattr(
+            cls, '__shard_binds__', None
+        )
 
         super(BindMeta, cls).__init__(name, bases, d)
 
-        if (
-            bind_key is not None
-            and getattr(cls, '__table__', None) is not None
-        ):
-            cls.__table__.info['bind_key'] = bind_key
+        table = getattr(cls, '__table__', None)
+
+        if bind_key is not None and table is not None:
+            table.info['bind_key'] = bind_key
+
+        if shard_key is not None and table is not None:
+            shard_binds = tuple(shard_binds or ())
+
+            if not shard_binds:
+                raise ShardKeyError(
+                    '{} has a shard key but no shard binds.'.format(name)
+                )
+
+            table.info['shard_key'] = shard_key
+            table.metadata.info[_SHARDED_KEY] = True
+            table.info['shard_binds'] = shard_binds
+            table.info['shard_resolver'] = getattr(
+                cls, '__shard_resolver__', None
+            ) or _default_shard_resolver(shard_binds)
 
 
 class SQLAlchemy:
     def __init__(
-        self, url=None, binds=None, session_options=None, engine_options=None
+        self,
+        url=None,
+        binds=None,
+        session_options=None,
+        engine_options=None,
+        max_workers=None,
+        replicas=None,
+        replica_strategy='round_robin',
+        query_cache_size=1000,
+        query_cache_ttl=60,
+        compiled_cache_size=None,
+        session_pool_size=0,
+        slow_query_log=None,
+        connection_budget=None,
+        processes=1,
+        circuit_breaker_threshold=None,
+        circuit_breaker_timeout=30,
     ):
         self.Model = self.make_declarative_base()
-        self._engines = {}
+        self.stats = Stats()
+        self._hot_queries = []
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(
+                after_in_child=functools.partial(
+                    _after_fork, weakref.ref(self)
+                )
+            )
 
         self.configure(
             url=url,
             binds=binds,
             session_options=session_options,
             engine_options=engine_options,
+            max_workers=max_workers,
+            replicas=replicas,
+            replica_strategy=replica_strategy,
+            query_cache_size=query_cache_size,
+            query_cache_ttl=query_cache_ttl,
+            compiled_cache_size=compiled_cache_size,
+            session_pool_size=session_pool_size,
+            slow_query_log=slow_query_log,
+            connection_budget=connection_budget,
+            processes=processes,
+            circuit_breaker_threshold=circuit_breaker_threshold,
+            circuit_breaker_timeout=circuit_breaker_timeout,
         )
 
     def configure(
-        self, url=None, binds=None, session_options=None, engine_options=None
+        self,
+        url=None,
+        binds=None,
+        session_options=None,
+        engine_options=None,
+        max_workers=None,
+        replicas=None,
+        replica_strategy='round_robin',
+        query_cache_size=1000,
+        query_cache_ttl=60,
+        compiled_cache_size=None,
+        session_pool_size=0,
+        slow_query_log=None,
+        connection_budget=None,
+        processes=1,
+        circuit_breaker_threshold=None,
+        circuit_breaker_timeout=30,
     ):
+        """Configures the database connection(s).
+
+        `max_workers` maps bind keys (None for the default database) to the
+        number of workers `as_future` may use for that bind. Binds not listed
+        there get as many workers as their engine can hand out connections.
+        Sizes set with `set_max_workers` take precedence over both.
+
+        `replicas` maps bind keys (None for the default database) to lists of
+        URLs of read replicas. SELECTs are spread across them either in turn
+        (`round_robin`) or by picking the replica with the fewest connections
+        checked out (`least_connections`).
+
+        Results of queries run with the `cache` execution option are kept in a
+        cache of `query_cache_size` entries, either for the lifetime of the
+        session (`cache='request'`), or for the whole process for up to
+        `query_cache_ttl` seconds (`cache='process'`).
+
+        `compiled_cache_size` replaces the compiled statement cache SQLAlchemy
+        creates for each engine. Either an int, for a single cache shared by
+        all engines, or a dictionary mapping bind keys (None for the default
+        database) to the size of a cache for the engines of that bind.
+
+        `session_pool_size` is the number of sessions `SessionMixin` keeps
+        around for reuse once requests finish (none by default).
+
+        Statements taking longer than the threshold of `slow_query_log` (a
+        `SlowQueryLog`) are recorded there.
+
+        `connection_budget` is the number of connections all `processes`
+        together may open to each database, either as an int, or as a
+        dictionary mapping bind keys to budgets. Each engine's pool gets an
+        even share of it, without overflow.
+
+        With `circuit_breaker_threshold` set, each bind gets a `CircuitBreaker`
+        which opens after that many connection or operational errors in a
+        row, and lets a probe through every `circuit_breaker_timeout` seconds.
+        """
+        if replica_strategy not in _REPLICA_STRATEGIES:
+            raise ValueError(
+                'unknown replica strategy {}.'.format(replica_strategy)
+            )
+
         self.url = url
         self.binds = binds or {}
+        self.replicas = replicas or {}
+        self.replica_strategy = replica_strategy
         self._engine_options = engine_options or {}
+        self._engines = {}
+        self._binds_map = None
+        self._bind_keys = {}
+        self._replica_engines = {}
+        self._replica_counters = collections.defaultdict(itertools.count)
+        self._autocommit_engines = {}
+        self.query_cache_size = query_cache_size
+        self.query_cache = QueryCache(query_cache_size, query_cache_ttl)
+        self._compiled_cache_size = compiled_cache_size
+        self._compiled_caches = {}
+        self.session_pool_size = session_pool_size
+        self._session_pool = collections.deque()  # type: Deque[SessionEx]
+        self.slow_query_log = slow_query_log
+        self._in_flight = {}  # type: Dict[tuple, Future]
+        self.connection_budget = connection_budget
+        self.processes = processes
+        self._circuit_breakers = {}
+
+        max_workers = max_workers or {}
+
+        if circuit_breaker_threshold is not None:
+            for bind in [None] + list(self.binds):
+                self._circuit_breakers[bind] = CircuitBreaker(
+                    circuit_breaker_threshold, circuit_breaker_timeout
+                )
+
+        worker_binds = ([None] if url else []) + list(self.binds)
+
+        # binds configured by an earlier call which aren't there anymore
+        for bind in set(getattr(self, '_worker_binds', ())) - set(
+            worker_binds
+        ):
+            _async_exec.configure_bind(bind, None)
+
+        self._worker_binds = worker_binds
+
+        for bind in worker_binds:
+            _async_exec.configure_bind(
+                bind,
+                max_workers.get(bind)
+                or functools.partial(self.get_pool_capacity, bind),
+            )
 
         self.sessionmaker = sessionmaker(
             class_=SessionEx, db=self, **(session_options or {})
         )
+        self.async_sessionmaker = sessionmaker(
+            class_=AsyncSessionEx, db=self, **(session_options or {})
+        )
 
     @property
     def engine(self):
@@ -222,7 +2684,221 @@ class SQLAlchemy:
                 raise RuntimeError('bind {} undefined.'.format(bind))
             url = self.binds[bind]
 
-        return create_engine(url, **self._engine_options)
+        return self._create_engine(url, bind)
+
+    def _create_engine(self, url, bind=None):
+        options = self._engine_options
+
+        pool_size = self.get_pool_size(bind)
+        if pool_size is not None:
+            options = dict(options, pool_size=pool_size, max_overflow=0)
+
+        if make_url(url).get_dialect().is_async:
+            engine = create_async_engine(url, **options)
+        else:
+            engine = create_engine(url, **options)
+
+            event.listen(
+                engine, 'before_cursor_execute', _track_dbapi_connection
+            )
+            event.listen(
+                engine, 'after_cursor_execute', _untrack_dbapi_connection
+            )
+            event.listen(engine, 'handle_error', _untrack_dbapi_connection)
+
+        _instrument_engine(
+            engine,
+            self.stats,
+            bind,
+            self.slow_query_log,
+            self.get_circuit_breaker(bind),
+        )
+
+        compiled_cache = self.get_compiled_cache(bind)
+        if compiled_cache is not None:
+            getattr(engine, 'sync_engine', engine).update_execution_options(
+                compiled_cache=compiled_cache
+            )
+
+        return engine
+
+    def get_circuit_breaker(self, bind=None):
+        """Returns the circuit breaker of a bind, or None if circuit breaking
+        isn't enabled.
+        """
+        return self._circuit_breakers.get(bind)
+
+    def get_pool_size(self, bind=None):
+        """Returns this process' share of the connection budget of a bind, or
+        None if it doesn't have a budget.
+        """
+        budget = self.connection_budget
+
+        if isinstance(budget, dict):
+            budget = budget.get(bind)
+
+        if budget is None:
+            return None
+
+        return max(1, budget // self.processes)
+
+    def after_fork(self, processes=None):
+        """Gets rid of the state inherited from the parent process after a
+        fork: the connections in the pools of the engines are dropped without
+        being closed (since they're still used by the parent), along with the
+        `as_future` thread pools.
+
+        This is called in child processes on its own, where the platform
+        supports it (see `os.register_at_fork`). `processes` updates the
+        number of processes the connection budget is split across, in which
+        case the engines are created again with their new share.
+        """
+        engines = list(self._engines.values()) + [
+            engine
+            for engines in self._replica_engines.values()
+            for engine in engines
+        ]
+
+        for engine in engines:
+            getattr(engine, 'sync_engine', engine).dispose(close=False)
+
+        if processes is not None and processes != self.processes:
+            self.processes = processes
+
+            if self.connection_budget is not None:
+                self._engines = {}
+                self._binds_map = None
+                self._bind_keys = {}
+                self._replica_engines = {}
+                self._autocommit_engines = {}
+
+        self._in_flight = {}
+        self._session_pool.clear()
+        self.stats.reset()
+
+        _async_exec.after_fork()
+
+    def acquire_session(
+        self, read_only=False, use_primary=False, primary_after_write=False
+    ):
+        """Returns a session from the pool of reusable sessions, or a new one
+        if the pool is empty. Sessions are handed back with `release_session`.
+        """
+        try:
+            session = self._session_pool.pop()
+        except IndexError:
+            return self.sessionmaker(
+                read_only=read_only,
+                use_primary=use_primary,
+                primary_after_write=primary_after_write,
+            )
+
+        session.read_only = read_only
+        session.use_primary = use_primary
+        session.primary_after_write = primary_after_write
+
+        return session
+
+    def release_session(self, session):
+        """Closes a session, and keeps it for reuse if the pool isn't full.
+        The session must not be used anymore afterwards.
+        """
+        if len(self._session_pool) >= self.session_pool_size or not (
+            isinstance(session, SessionEx) and session.db is self
+        ):
+            session.close()
+            return
+
+        session._reset_for_reuse()
+        self._session_pool.append(session)
+
+    def get_compiled_cache(self, bind=None):
+        """Returns the compiled statement cache used by the engines of a bind,
+        or None if they use the ones SQLAlchemy creates.
+        """
+        size = self._compiled_cache_size
+
+        if isinstance(size, dict):
+            if bind not in size:
+                return None
+            key, capacity = bind, size[bind]
+        elif size is not None:
+            # a single cache shared by all binds
+            key, capacity = '__all__', size
+        else:
+            return None
+
+        cache = self._compiled_caches.get(key)
+
+        if cache is None:
+            cache = self._compiled_caches.setdefault(
+                key, CompiledCache(capacity)
+            )
+
+        return cache
+
+    def add_hot_query(self, statement, bind=None):
+        """Registers a statement to be compiled ahead of time by `precompile`
+        (and `warm_up`). `bind` defaults to the bind of the tables the
+        statement uses.
+        """
+        if bind is None:
+            bind = next(
+                (
+                    table.info['bind_key']
+                    for table in find_tables(statement, check_columns=True)
+                    if 'bind_key' in getattr(table, 'info', {})
+                ),
+                None,
+            )
+
+        self._hot_queries.append((statement, bind))
+
+    def precompile(self):
+        """Compiles the statements registered with `add_hot_query` into the
+        compiled statement caches of the engines they'll run on, so that the
+        first requests running them don't pay for it. Returns the number of
+        statements compiled.
+
+        Engines using an asyncio driver are skipped, see `async_warm_up`.
+        """
+        return self._precompile(connect=True)
+
+    def _precompile(self, connect=False, include_async=False):
+        count = 0
+
+        for statement, bind in self._hot_queries:
+            for engine in [self.get_engine(bind)] + self.get_replica_engines(
+                bind
+            ):
+                if hasattr(engine, 'sync_engine'):
+                    if not include_async:
+                        continue
+                    engine = engine.sync_engine
+                elif connect:
+                    # statements are compiled for the server version the
+                    # dialect finds out about on the first connection
+                    engine.connect().close()
+
+                statement._compile_w_cache(
+                    engine.dialect,
+                    compiled_cache=engine._execution_options.get(
+                        'compiled_cache', engine._compiled_cache
+                    ),
+                    column_keys=[],
+                )
+                count += 1
+
+        return count
+
+    def is_async(self, bind=None):
+        """Returns whether the URL for a bind uses an asyncio driver."""
+        url = self.url if bind is None else self.binds.get(bind)
+
+        if not url:
+            return False
+
+        return make_url(url).get_dialect().is_async
 
     def get_engine(self, bind=None):
         """Returns a specific engine. cached in self._engines"""
@@ -231,22 +2907,266 @@ class SQLAlchemy:
         if engine is None:
             engine = self.create_engine(bind)
             self._engines[bind] = engine
+            self._bind_keys[getattr(engine, 'sync_engine', engine)] = bind
 
         return engine
 
+    def get_bind_key(self, engine):
+        """Returns the bind key of an engine created by this object, or False
+        if it wasn't created by this object.
+        """
+        return self._bind_keys.get(
+            getattr(engine, 'sync_engine', engine), False
+        )
+
+    def get_replica_engines(self, bind=None):
+        """Returns the engines for the read replicas of a bind."""
+        engines = self._replica_engines.get(bind)
+
+        if engines is None:
+            engines = [
+                self._create_engine(url, bind)
+                for url in self.replicas.get(bind, ())
+            ]
+            self._replica_engines[bind] = engines
+
+        return engines
+
+    def get_read_engine(self, bind=None):
+        """Returns the engine SELECTs for a bind should be sent to, which is
+        one of its replicas if it has any, or the primary otherwise.
+        """
+        engines = self.get_replica_engines(bind)
+
+        if not engines:
+            return self.get_engine(bind)
+
+        if self.replica_strategy == 'least_connections':
+            return min(engines, key=_checked_out_connections)
+
+        return engines[next(self._replica_counters[bind]) % len(engines)]
+
+    def get_autocommit_engine(self, engine):
+        """Returns a copy of an engine (sharing its connection pool) which runs
+        statements in autocommit mode, as used by read-only sessions.
+        """
+        autocommit_engine = self._autocommit_engines.get(engine)
+
+        if autocommit_engine is None:
+            autocommit_engine = engine.execution_options(
+                isolation_level='AUTOCOMMIT'
+            )
+            self._autocommit_engines[engine] = autocommit_engine
+
+        return autocommit_engine
+
+    def warm_up(self, connections=None, validate=False, max_workers=None):
+        """Creates the engines of all binds (and their replicas) and opens up
+        to `connections` connections for each of them at once, filling up
+        their pools (which is also the default). If `validate` is set, each
+        connection is pinged as well.
+
+        Statements registered with `add_hot_query` are compiled afterwards.
+
+        Engines using an asyncio driver are skipped, see `async_warm_up`.
+        Returns the number of connections opened for each bind.
+        """
+        targets = [
+            (bind, engine, count)
+            for bind, engine, count in self._get_warm_up_targets(connections)
+            if not hasattr(engine, 'sync_engine')
+        ]
+        result = {bind: 0 for bind, _, _ in targets}
+
+        if not targets:
+            return result
+
+        total = sum(count for _, _, count in targets)
+
+        futures = []
+        if total:
+            with ThreadPoolExecutor(
+                max_workers=max_workers or total
+            ) as executor:
+                futures = [
+                    (bind, executor.submit(_open_connection, engine, validate))
+                    for bind, engine, count in targets
+                    for _ in range(count)
+                ]
+
+        opened = []
+        try:
+            # raises the first error, after closing whatever was opened
+            for bind, future in futures:
+                if future.exception() is None:
+                    opened.append(future.result())
+                    result[bind] += 1
+
+            for _, future in futures:
+                future.result()
+        finally:
+            for connection in opened:
+                connection.close()
+
+        self._precompile()
+
+        return result
+
+    async def async_warm_up(self, connections=None, validate=False):
+        """Awaitable counterpart of `warm_up`, which also warms up engines
+        using an asyncio driver. Connections for the other engines are opened
+        on the `as_future` pools of their binds.
+        """
+        targets = list(self._get_warm_up_targets(connections))
+        result = {bind: 0 for bind, _, _ in targets}
+
+        futures = []
+        opened = []
+        try:
+            try:
+                for bind, engine, count in targets:
+                    for _ in range(count):
+                        future = self._async_open_connection(
+                            bind, engine, validate
+                        )
+                        futures.append((bind, future))
+            finally:
+                # waits for whatever was started, even if starting the rest
+                # failed (e.g. with CircuitOpenError), so that it gets closed
+                for bind, future in futures:
+                    try:
+                        opened.append(await future)
+                    except Exception:
+                        continue
+                    result[bind] += 1
+
+            for _, future in futures:
+                future.result()
+        finally:
+            for connection in opened:
+                closed = connection.close()
+
+                if closed is not None:
+                    await closed
+
+        self._precompile(include_async=True)
+
+        return result
+
+    def _async_open_connection(self, bind, engine, validate):
+        if hasattr(engine, 'sync_engine'):
+            return gen.convert_yielded(
+                _open_async_connection(engine, validate)
+            )
+
+        return _async_exec.as_future(
+            functools.partial(_open_connection, engine, validate),
+            bind=bind,
+            wait=True,
+            db=self,
+        )
+
+    def _get_warm_up_targets(self, connections=None):
+        binds = ([None] if self.url else []) + list(self.binds)
+
+        for bind in binds:
+            for engine in [self.get_engine(bind)] + self.get_replica_engines(
+                bind
+            ):
+                pool = getattr(engine, 'sync_engine', engine).pool
+                count = pool.size() if isinstance(pool, QueuePool) else 1
+
+                if connections is not None:
+                    count = min(count, connections)
+
+                yield bind, engine, count
+
+    def get_pool_capacity(self, bind=None):
+        """Returns the number of connections the engine for a bind can hand
+        out at once, or None if its pool is not bounded.
+        """
+        pool = self.get_engine(bind).pool
+
+        if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+            return None
+
+        return pool.size() + pool._max_overflow
+
+    def get_stats(self, bind=None):
+        """Returns the timings recorded for a bind (see `Stats`), along with
+        the number of connections its engines currently have checked out, how
+        many of those are over the size of their pools, and the state of its
+        caches and circuit breaker.
+        """
+        result = {
+            metric: timing.as_dict()
+            for metric, timing in self.stats.get(bind).items()
+        }
+
+        engines = [self._engines.get(bind)] + self._replica_engines.get(
+            bind, []
+        )
+        pools = [
+            getattr(engine, 'sync_engine', engine).pool
+            for engine in engines
+            if engine is not None
+        ]
+
+        compiled_cache = self.get_compiled_cache(bind)
+        if compiled_cache is not None:
+            result['compiled_cache'] = compiled_cache.as_dict()
+
+        circuit_breaker = self.get_circuit_breaker(bind)
+        if circuit_breaker is not None:
+            result['circuit_breaker'] = circuit_breaker.as_dict()
+
+        result['checked_out'] = sum(
+            pool.checkedout() for pool in pools if isinstance(pool, QueuePool)
+        )
+        result['overflow'] = sum(
+            max(0, pool.overflow())
+            for pool in pools
+            if isinstance(pool, QueuePool)
+        )
+
+        return result
+
     def get_tables_for_bind(self, bind=None):
         """Returns a list of all tables relevant for a bind."""
         return [
             table
             for table in self.Model.metadata.tables.values()
-            if table.info.get('bind_key') == bind
+            if (
+                bind in table.info['shard_binds']
+                if 'shard_binds' in table.info
+                else table.info.get('bind_key') == bind
+            )
         ]
 
+    def get_shard(self, model, value):
+        """Returns the bind key of the shard rows of a sharded model with the
+        given shard key value are stored in.
+        """
+        table = getattr(model, '__table__', model)
+
+        return table.info['shard_resolver'](value)
+
     def get_binds(self):
         """Returns a dictionary with a table->engine mapping.
 
         This is suitable for use of sessionmaker(binds=db.get_binds()).
+
+        The mapping is computed once, and recomputed only after `configure` is
+        called again or tables are added to the metadata.
         """
+        version = (
+            len(self.metadata.tables),
+            self.metadata.info.get(_TABLES_VERSION_KEY, 0),
+        )
+
+        if self._binds_map is not None and self._binds_map[0] == version:
+            return self._binds_map[1]
+
         binds = [None] + list(self.binds)
 
         result = {}
@@ -257,33 +3177,314 @@ class SQLAlchemy:
 
             result.update(dict((table, engine) for table in tables))
 
+        self._binds_map = (version, result)
+
         return result
 
-    def _execute_for_all_tables(self, bind, operation, skip_tables=False):
+    def _execute_for_all_tables(
+        self,
+        bind,
+        operation,
+        skip_tables=False,
+        checkfirst=True,
+        parallel=False,
+        max_workers=None,
+        raise_errors=True,
+    ):
         if bind == '__all__':
             binds = [None] + list(self.binds)
         elif isinstance(bind, str) or bind is None:
             binds = [bind]
         else:
-            binds = bind
+            binds = list(bind)
 
-        for bind in binds:
-            extra = {}
+        def execute(bind):
+            started = time.perf_counter()
+            report = {'tables': [], 'seconds': 0.0, 'error': None}
+
+            try:
+                report['tables'] = self._execute_for_tables(
+                    bind, operation, skip_tables, checkfirst
+                )
+            except Exception as e:
+                if raise_errors:
+                    raise
+                report['error'] = e
+
+            report['seconds'] = time.perf_counter() - started
+
+            return report
+
+        if not parallel or len(binds) < 2:
+            return {bind: execute(bind) for bind in binds}
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or len(binds)
+        ) as executor:
+            futures = {bind: executor.submit(execute, bind) for bind in binds}
+
+        return {bind: future.result() for bind, future in futures.items()}
+
+    def _execute_for_tables(self, bind, operation, skip_tables, checkfirst):
+        engine = self.get_engine(bind)
+
+        if skip_tables:
+            tables = list(self.Model.metadata.tables.values())
+        else:
+            tables = self.get_tables_for_bind(bind)
+
+        if checkfirst:
+            # a single query per schema, instead of one per table
+            inspector = inspect(engine)
+            existing = {
+                (schema, name)
+                for schema in {table.schema for table in tables}
+                for name in inspector.get_table_names(schema=schema)
+            }
+
+            tables = [
+                table
+                for table in tables
+                if ((table.schema, table.name) in existing)
+                == (operation == 'drop_all')
+            ]
+
+            if not tables:
+                return []
+
+        op = getattr(self.Model.metadata, operation)
+        op(bind=engine, tables=tables, checkfirst=False)
+
+        return [table.fullname for table in tables]
+
+    def create_all(
+        self,
+        bind='__all__',
+        checkfirst=True,
+        parallel=False,
+        max_workers=None,
+        raise_errors=True,
+    ):
+        """Creates all tables.
 
-            if not skip_tables:
-                tables = self.get_tables_for_bind(bind)
-                extra['tables'] = tables
+        With `parallel`, the binds are set up concurrently, on up to
+        `max_workers` threads (one per bind by default). Returns a dictionary
+        mapping each bind to a report of the tables it created, the time it
+        took, and the error it ran into if `raise_errors` is not set.
+        """
+        return self._execute_for_all_tables(
+            bind,
+            'create_all',
+            checkfirst=checkfirst,
+            parallel=parallel,
+            max_workers=max_workers,
+            raise_errors=raise_errors,
+        )
+
+    def drop_all(
+        self,
+        bind='__all__',
+        checkfirst=True,
+        parallel=False,
+        max_workers=None,
+        raise_errors=True,
+    ):
+        """Drops all tables. See `create_all` for the arguments."""
+        return self._execute_for_all_tables(
+            bind,
+            'drop_all',
+            checkfirst=checkfirst,
+            parallel=parallel,
+            max_workers=max_workers,
+            raise_errors=raise_errors,
+        )
+
+    async def bulk_insert(
+        self,
+        model,
+        rows: Iterable[dict],
+        chunk_size: int = 1000,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> int:
+        """Inserts rows (given as dictionaries) into the table of a model,
+        without building ORM objects for them, returning the number of rows
+        written.
+
+        The rows are written in chunks of `chunk_size` rows, each in a
+        transaction of its own, on the `as_future` pool of the model's bind.
+        `progress` is called on the IOLoop after each chunk, with the number
+        of rows written so far and the total (None if `rows` has no length).
+
+        Rows of sharded models are written to the shard of their shard key,
+        and raise `ShardKeyError` if they don't have one.
+        """
+        table = getattr(model, '__table__', model)
+
+        return await self._bulk_write(
+            table,
+            lambda chunk, engine: table.insert(),
+            rows,
+            chunk_size,
+            progress,
+        )
 
-            op = getattr(self.Model.metadata, operation)
-            op(bind=self.get_engine(bind), **extra)
+    async def bulk_upsert(
+        self,
+        model,
+        rows: Iterable[dict],
+        index_elements: Optional[Sequence[str]] = None,
+        chunk_size: int = 1000,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> int:
+        """Same as `bulk_insert`, except that rows conflicting with existing
+        ones on `index_elements` (the primary key by default) update them
+        instead, using `ON CONFLICT` or `ON DUPLICATE KEY UPDATE` depending on
+        the database.
+
+        On MySQL, `index_elements` is ignored: a row conflicting with any
+        primary or unique key updates the existing one. Raises `ValueError` for
+        databases other than PostgreSQL, SQLite and MySQL.
+        """
+        table = getattr(model, '__table__', model)
+
+        if index_elements is None:
+            index_elements = [column.name for column in table.primary_key]
+
+        def statement(chunk, engine):
+            return _upsert_statement(
+                table,
+                engine.dialect.name,
+                index_elements,
+                [name for name in chunk[0] if name not in index_elements],
+            )
+
+        return await self._bulk_write(
+            table, statement, rows, chunk_size, progress
+        )
+
+    def coalesce(self, statement, bind=None, session=None, key=None, **kwargs):
+        """Runs a SELECT, returning a Future for the list of its rows.
 
-    def create_all(self, bind='__all__'):
-        """Creates all tables."""
-        self._execute_for_all_tables(bind, 'create_all')
+        Concurrent calls for the same bind, SQL and parameters (or the same
+        `key`, if given) share a single execution, and all get its rows. The
+        statement runs on a connection of its own in autocommit mode (on a
+        replica, if the bind has any), so it only sees committed data. If
+        `session` is given and wrote something, the statement runs in that
+        session instead, without being shared, so that it sees those writes.
 
-    def drop_all(self, bind='__all__'):
-        """Drops all tables."""
-        self._execute_for_all_tables(bind, 'drop_all')
+        Statements reading from sharded tables need `bind` to be one of their
+        shards, and raise `ShardKeyError` otherwise.
+
+        Any other keyword arguments are passed on to `as_future`, for the
+        call starting the execution.
+        """
+        if not getattr(statement, 'is_select', False):
+            raise ValueError('only SELECT statements can be coalesced.')
+
+        if session is not None and session.has_writes:
+            return _async_exec.as_future(
+                lambda: session.execute(statement).all(),
+                bind=bind,
+                db=self,
+                **kwargs
+            )
+
+        for table in find_tables(statement, check_columns=True):
+            shards = getattr(table, 'info', {}).get('shard_binds')
+
+            if shards is not None and bind not in shards:
+                raise ShardKeyError(
+                    '{} is sharded, pass the shard to query as bind.'.format(
+                        table.name
+                    )
+                )
+
+        engine = self.get_read_engine(bind)
+
+        if key is None:
+            compiled = statement.compile(dialect=engine.dialect)
+            key = (str(compiled), _hashable(compiled.params))
+
+        key = (bind, key)
+        shared = self._in_flight.get(key)
+
+        if shared is None:
+            engine = self.get_autocommit_engine(engine)
+
+            if self.is_async(bind):
+                shared = gen.convert_yielded(
+                    _fetch_rows_async(engine, statement)
+                )
+            else:
+                shared = _async_exec.as_future(
+                    functools.partial(_fetch_rows, engine, statement),
+                    bind=bind,
+                    db=self,
+                    **kwargs
+                )
+
+            self._in_flight[key] = shared
+            shared.add_done_callback(
+                functools.partial(self._on_coalesced, key)
+            )
+
+        # waiters get a future of their own, so that cancelling one of them
+        # doesn't cancel the others
+        future = Future()  # type: Future
+        chain_future(shared, future)
+        return future
+
+    def _on_coalesced(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    async def _bulk_write(self, table, statement, rows, chunk_size, progress):
+        total = len(rows) if hasattr(rows, '__len__') else None
+        written = 0
+        iterator = iter(rows)
+
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+
+            if not chunk:
+                return written
+
+            futures = []
+
+            # the rows of sharded tables are split up between the shards
+            for bind, bind_rows in _rows_by_bind(table, chunk).items():
+                engine = self.get_engine(bind)
+
+                if self.is_async(bind):
+                    futures.append(
+                        _write_chunk_async(
+                            engine, statement(bind_rows, engine), bind_rows
+                        )
+                    )
+                else:
+                    futures.append(
+                        _async_exec.as_future(
+                            functools.partial(
+                                _write_chunk,
+                                engine,
+                                statement(bind_rows, engine),
+                                bind_rows,
+                            ),
+                            bind=bind,
+                            db=self,
+                        )
+                    )
+
+            await gen.multi(futures)
+
+            # the rows don't go through a session, which would take care of
+            # this otherwise
+            self.query_cache.invalidate(_table_keys([table]))
+
+            written += len(chunk)
+
+            if progress is not None:
+                progress(written, total)
 
     def make_declarative_base(self):
         return declarative_base(metaclass=BindMeta)